@@ -0,0 +1,279 @@
+"""Binary decision diagram module
+
+A small package of reduced ordered binary decision diagrams (BDDs) in pure
+Python, used by the symbolic Kripke structures of mlsolver.symbolic.
+"""
+
+_TERMINAL_LEVEL = float('inf')
+
+
+class BDD:
+    """
+    Manager of reduced ordered binary decision diagrams. Nodes are integers:
+    0 and 1 are the constants false and true, and every other node tests the
+    variable of a level and has a low (false) and high (true) child. Levels
+    are integers and variables are tested in ascending order of level. Equal
+    functions are always the same node.
+    """
+
+    def __init__(self):
+        self._nodes = [(_TERMINAL_LEVEL, 0, 0), (_TERMINAL_LEVEL, 1, 1)]
+        self._unique = {}
+        self._ite_cache = {}
+
+    def level(self, u):
+        """Returns the level of the variable a node tests.
+        """
+        return self._nodes[u][0]
+
+    def node(self, level, low, high):
+        """Returns the node testing a level with the given children.
+        """
+        if low == high:
+            return low
+        key = (level, low, high)
+        u = self._unique.get(key)
+        if u is None:
+            u = len(self._nodes)
+            self._nodes.append(key)
+            self._unique[key] = u
+        return u
+
+    def var(self, level):
+        """Returns the node of the variable of a level.
+        """
+        return self.node(level, 0, 1)
+
+    def _cofactors(self, u, level):
+        node_level, low, high = self._nodes[u]
+        if node_level == level:
+            return low, high
+        return u, u
+
+    def ite(self, f, g, h):
+        """Returns the node of 'if f then g else h'.
+        """
+        if f == 1:
+            return g
+        if f == 0:
+            return h
+        if g == h:
+            return g
+        if g == 1 and h == 0:
+            return f
+        key = (f, g, h)
+        result = self._ite_cache.get(key)
+        if result is None:
+            top = min(self._nodes[f][0], self._nodes[g][0], self._nodes[h][0])
+            f0, f1 = self._cofactors(f, top)
+            g0, g1 = self._cofactors(g, top)
+            h0, h1 = self._cofactors(h, top)
+            result = self.node(top, self.ite(f0, g0, h0), self.ite(f1, g1, h1))
+            self._ite_cache[key] = result
+        return result
+
+    def neg(self, u):
+        return self.ite(u, 0, 1)
+
+    def conj(self, u, v):
+        return self.ite(u, v, 0)
+
+    def disj(self, u, v):
+        return self.ite(u, 1, v)
+
+    def equiv(self, u, v):
+        return self.ite(u, v, self.neg(v))
+
+    def exists(self, levels, u):
+        """Returns the node of u with the variables of the given levels
+        existentially quantified.
+        """
+        return self.and_exists(u, 1, levels)
+
+    def and_exists(self, u, v, levels):
+        """Returns the node of 'exists levels: u and v' (the relational
+        product), without building the conjunction first.
+        """
+        levels = frozenset(levels)
+        last = max(levels, default=-1)
+        memo = {}
+
+        def go(u, v):
+            if u == 0 or v == 0:
+                return 0
+            if u == 1 and v == 1:
+                return 1
+            key = (u, v) if u <= v else (v, u)
+            result = memo.get(key)
+            if result is None:
+                top = min(self._nodes[u][0], self._nodes[v][0])
+                if top > last:
+                    result = self.conj(u, v)
+                else:
+                    u0, u1 = self._cofactors(u, top)
+                    v0, v1 = self._cofactors(v, top)
+                    if top in levels:
+                        result = go(u0, v0)
+                        if result != 1:
+                            result = self.disj(result, go(u1, v1))
+                    else:
+                        result = self.node(top, go(u0, v0), go(u1, v1))
+                memo[key] = result
+            return result
+
+        return go(u, v)
+
+    def rename(self, u, mapping):
+        """Returns the node of u with the variables of some levels replaced by
+        those of other levels, given as a dict from level to level.
+        """
+        memo = {}
+        keys = sorted(mapping)
+        order_preserving = all(mapping[a] < mapping[b] for a, b in zip(keys, keys[1:]))
+
+        def go(u):
+            if u < 2:
+                return u
+            result = memo.get(u)
+            if result is None:
+                level, low, high = self._nodes[u]
+                if order_preserving:
+                    # Raises KeyError for a level that is not renamed
+                    result = self.node(mapping[level], go(low), go(high))
+                else:
+                    result = self.ite(self.var(mapping.get(level, level)), go(high), go(low))
+                memo[u] = result
+            return result
+
+        if order_preserving:
+            # If every level of u is renamed and the order is kept, the nodes
+            # can be copied as they are
+            try:
+                return go(u)
+            except KeyError:
+                memo.clear()
+                order_preserving = False
+        return go(u)
+
+    def support(self, u):
+        """Returns the set of levels whose variables u depends on.
+        """
+        levels = set()
+        seen = set()
+        stack = [u]
+        while stack:
+            u = stack.pop()
+            if u < 2 or u in seen:
+                continue
+            seen.add(u)
+            level, low, high = self._nodes[u]
+            levels.add(level)
+            stack.append(low)
+            stack.append(high)
+        return levels
+
+    def exactly(self, levels, k):
+        """Returns the node that is true iff exactly k of the variables of the
+        given levels are true.
+        """
+        levels = sorted(levels)
+        memo = {}
+
+        def go(i, remaining):
+            if remaining < 0 or remaining > len(levels) - i:
+                return 0
+            if i == len(levels):
+                return 1
+            key = (i, remaining)
+            if key not in memo:
+                memo[key] = self.node(levels[i], go(i + 1, remaining), go(i + 1, remaining - 1))
+            return memo[key]
+
+        return go(0, k)
+
+    def count(self, u, levels):
+        """Returns the number of assignments to the variables of the given
+        levels that satisfy u, which may only depend on these variables.
+        """
+        levels = sorted(levels)
+        position = {level: i for i, level in enumerate(levels)}
+        memo = {}
+
+        def go(u):
+            # Number of satisfying assignments to the levels from u's level on
+            if u < 2:
+                return u
+            result = memo.get(u)
+            if result is None:
+                level, low, high = self._nodes[u]
+                result = go(low) * 2 ** skipped(level, low) + go(high) * 2 ** skipped(level, high)
+                memo[u] = result
+            return result
+
+        def skipped(level, child):
+            child_position = len(levels) if child < 2 else position[self._nodes[child][0]]
+            return child_position - position[level] - 1
+
+        if u < 2:
+            return u * 2 ** len(levels)
+        return go(u) * 2 ** position[self._nodes[u][0]]
+
+    def assignments(self, u, levels):
+        """Yields every assignment to the variables of the given levels that
+        satisfies u, as the set of levels assigned true.
+        """
+        levels = sorted(levels)
+
+        def go(u, i, true_levels):
+            if u == 0:
+                return
+            if i == len(levels):
+                yield frozenset(true_levels)
+                return
+            low, high = self._cofactors(u, levels[i])
+            yield from go(low, i + 1, true_levels)
+            yield from go(high, i + 1, true_levels + [levels[i]])
+
+        return go(u, 0, [])
+
+    def function(self, u):
+        """Returns a node wrapped as a Function.
+        """
+        return Function(self, u)
+
+
+class Function:
+    """
+    A node of a BDD manager with the operators of bitsets, so that it can be
+    used wherever mlsolver expects a set of worlds: & (and), | (or), ~ (not)
+    and == (equivalence, checked in constant time).
+    """
+
+    __slots__ = ('bdd', 'node')
+
+    def __init__(self, bdd, node):
+        self.bdd = bdd
+        self.node = node
+
+    def __and__(self, other):
+        return Function(self.bdd, self.bdd.conj(self.node, other.node))
+
+    def __or__(self, other):
+        return Function(self.bdd, self.bdd.disj(self.node, other.node))
+
+    def __invert__(self):
+        return Function(self.bdd, self.bdd.neg(self.node))
+
+    def __eq__(self, other):
+        if isinstance(other, Function):
+            return self.bdd is other.bdd and self.node == other.node
+        # Compare with the integers 0 and 1 like an empty or full bitset
+        return self.node == other
+
+    def __hash__(self):
+        return hash(self.node)
+
+    def __str__(self):
+        return "Function(" + str(self.node) + ")"
+
+    __repr__ = __str__
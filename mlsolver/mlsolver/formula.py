@@ -3,6 +3,86 @@
 This module unites all operators from propositional and modal logic.
 """
 
+import copy
+import weakref
+
+from mlsolver.kripke import Partition
+
+# Canonical formulas by their type, labels and the ids of their canonical
+# subformulas. Entries disappear with their formula, and a live formula keeps
+# its subformulas (and so their ids) alive.
+_interned = weakref.WeakValueDictionary()
+
+# Static translations of formulas with Update modalities, shared by every
+# formula they occur in. Entries disappear with their formula.
+_translations = weakref.WeakKeyDictionary()
+
+
+def intern(formula):
+    """Returns the canonical formula structurally equal to the given one.
+    Equal formulas are interned to the same object, sharing subformulas.
+    Iterative, so deep formulas don't hit the recursion limit.
+    """
+    if formula.__dict__.get('_is_canonical'):
+        # Its subformulas are canonical too, so there is nothing to walk
+        return formula
+    canonical_of = {}
+    stack = [(formula, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in canonical_of:
+            continue
+        if node.__dict__.get('_is_canonical'):
+            canonical_of[id(node)] = node
+            continue
+        children = {}
+        for attribute in ('inner', 'left', 'right'):
+            child = getattr(node, attribute, None)
+            if child is not None:
+                children[attribute] = child
+        if not expanded:
+            # Intern the subformulas first
+            stack.append((node, True))
+            stack.extend((child, False) for child in children.values() if id(child) not in canonical_of)
+            continue
+        canonical_of[id(node)] = _intern_node(node, {a: canonical_of[id(child)] for a, child in children.items()})
+    return canonical_of[id(formula)]
+
+
+def _intern_node(formula, children):
+    """Returns the canonical formula of a formula whose subformulas have the
+    given canonical formulas.
+    """
+    key = [type(formula)]
+    for attribute in ('inner', 'left', 'right'):
+        if attribute in children:
+            key.append(id(children[attribute]))
+    for attribute in ('name', 'agent', 'agents', 'action_model', 'action'):
+        if hasattr(formula, attribute):
+            key.append(getattr(formula, attribute))
+    key = tuple(key)
+    canonical = _interned.get(key)
+    if canonical is None:
+        canonical = formula
+        if any(getattr(formula, a) is not child for a, child in children.items()):
+            canonical = copy.copy(formula)
+            canonical.__dict__.pop('_class_memo', None)
+            for attribute, child in children.items():
+                setattr(canonical, attribute, child)
+        canonical._is_canonical = True
+        _interned[key] = canonical
+    return canonical
+
+
+def _structural_hash(formula, *parts):
+    """Returns the hash of a formula from its type and parts, computed once.
+    """
+    try:
+        return formula._hash
+    except AttributeError:
+        formula._hash = hash((type(formula),) + parts)
+        return formula._hash
+
 
 class Atom:
     """
@@ -18,13 +98,33 @@ class Atom:
         # MODIFIED for one-night ultimate werewolf: dictionary read instead of looping through a list
         return ks.worlds[world_to_test].assignment.get(self.name, False)
 
+    def extension(self, ks):
+        """Function returns the set of all worlds where the variable is
+        assigned true.
+        """
+        return ks.atom_extension(self.name)
+
     def __eq__(self, other):
         return isinstance(other, Atom) and other.name == self.name
 
+    def __hash__(self):
+        return _structural_hash(self, self.name)
+
     def __str__(self):
         return str(self.name)
 
 
+def _class_memo(formula, ks):
+    """Returns the results of a modal formula per class of a partitioned
+    relation, which are kept on the formula until the Kripke structure changes.
+    """
+    memo = getattr(formula, '_class_memo', None)
+    if memo is None or memo[0] is not ks.state:
+        memo = (ks.state, {})
+        formula._class_memo = memo
+    return memo[1]
+
+
 class Box:
     """
     Describes box operator of modal logic formula and it's semantics
@@ -34,15 +134,23 @@ class Box:
         self.inner = inner
 
     def semantic(self, ks, world_to_test):
-        # MODIFIED for one-night ultimate werewolf: return immediately on finding a counterexample
-        for relation in ks.relations:
-            if relation[0] == world_to_test and not self.inner.semantic(ks, relation[1]):
+        # MODIFIED for one-night ultimate werewolf: return immediately on finding a counterexample,
+        # only visiting the successors of world_to_test
+        for successor in ks.successors(None, world_to_test):
+            if not self.inner.semantic(ks, successor):
                 return False
         return True
 
+    def extension(self, ks):
+        everywhere = ks.all_worlds()
+        return everywhere & ~ks.preimage(None, everywhere & ~ks.extension(self.inner))
+
     def __eq__(self, other):
         return isinstance(other, Box) and self.inner == other.inner
 
+    def __hash__(self):
+        return _structural_hash(self, self.inner)
+
     def __str__(self):
         return u"\u2610" + str(self.inner)
 
@@ -57,15 +165,34 @@ class Box_a:
         self.agent = agent
 
     def semantic(self, ks, world_to_test):
-        # MODIFIED for one-night ultimate werewolf: return immediately on finding a counterexample
-        for relation in ks.relations.get(self.agent, {}):
-            if relation[0] == world_to_test and not self.inner.semantic(ks, relation[1]):
+        # MODIFIED for one-night ultimate werewolf: return immediately on finding a counterexample,
+        # only visiting the successors of world_to_test. Over a partition, evaluate once per class; worlds in no
+        # class have no successors and are not memoized, as any value (even None) can be a class id.
+        relation = ks.get_relation(self.agent)
+        if isinstance(relation, Partition) and world_to_test in relation.class_of:
+            class_id = relation.class_of[world_to_test]
+            memo = _class_memo(self, ks)
+            if class_id not in memo:
+                memo[class_id] = self._semantic_successors(ks, world_to_test)
+            return memo[class_id]
+        return self._semantic_successors(ks, world_to_test)
+
+    def _semantic_successors(self, ks, world_to_test):
+        for successor in ks.successors(self.agent, world_to_test):
+            if not self.inner.semantic(ks, successor):
                 return False
         return True
 
+    def extension(self, ks):
+        everywhere = ks.all_worlds()
+        return everywhere & ~ks.preimage(self.agent, everywhere & ~ks.extension(self.inner))
+
     def __eq__(self, other):
         return isinstance(other, Box_a) and self.inner == other.inner and self.agent == other.agent
 
+    def __hash__(self):
+        return _structural_hash(self, self.agent, self.inner)
+
     def __str__(self):
         return u"\u2610[" + str(self.agent) + "]" + str(self.inner)
 
@@ -74,25 +201,83 @@ class Box_star:
     """
     Describes semantic of multi modal Box^* operator.
     Semantic(Box_star phi) = min(Box Box ... Box phi, for all n in /N)
-    Simplification with n = 1: Box_star phi = phi and Box_a phi and Box_b phi ... and Box_n phi
+    MODIFIED: this is evaluated exactly, as phi holding in every world reachable
+    in zero or more steps of any agent's relation, instead of with n = 1.
     """
 
     def __init__(self, inner):
         self.inner = inner
 
     def semantic(self, ks, world_to_test, depth=1):
-        f = self.inner
-        for agents in ks.relations:
-            f = And(f, Box_a(agents, self.inner))
-        return f.semantic(ks, world_to_test)
+        reachable = ks.reachable(ks.agents(), world_to_test, reflexive=True)
+        return reachable & ~ks.extension(self.inner) == 0
+
+    def extension(self, ks):
+        return ks.group_extension(ks.agents(), ks.extension(self.inner), reflexive=True)
+
+    def __eq__(self, other):
+        return isinstance(other, Box_star) and self.inner == other.inner
+
+    def __hash__(self):
+        return _structural_hash(self, self.inner)
+
+    def __str__(self):
+        return u"\u2610*" + str(self.inner)
+
+
+class Common:
+    """
+    Describes common knowledge of a group of agents: the inner formula holds
+    in every world reachable in one or more steps of the group's relations.
+    """
+
+    def __init__(self, agents, inner):
+        self.agents = frozenset(agents)
+        self.inner = inner
+
+    def semantic(self, ks, world_to_test):
+        return ks.reachable(self.agents, world_to_test) & ~ks.extension(self.inner) == 0
+
+    def extension(self, ks):
+        return ks.group_extension(self.agents, ks.extension(self.inner))
 
-    # TODO
     def __eq__(self, other):
-        raise NotImplementedError
+        return isinstance(other, Common) and self.agents == other.agents and self.inner == other.inner
+
+    def __hash__(self):
+        return _structural_hash(self, self.agents, self.inner)
 
-    # TODO
     def __str__(self):
-        raise NotImplementedError
+        return "C[" + ",".join(sorted(str(a) for a in self.agents)) + "]" + str(self.inner)
+
+
+class Everybody:
+    """
+    Describes that every agent of a group knows the inner formula.
+    """
+
+    def __init__(self, agents, inner):
+        self.agents = frozenset(agents)
+        self.inner = inner
+
+    def semantic(self, ks, world_to_test):
+        return all(Box_a(agent, self.inner).semantic(ks, world_to_test) for agent in self.agents)
+
+    def extension(self, ks):
+        everywhere = ks.all_worlds()
+        failing = everywhere & ~ks.extension(self.inner)
+        for agent in self.agents:
+            everywhere &= ~ks.preimage(agent, failing)
+        return everywhere
+
+    def __eq__(self, other):
+        return isinstance(other, Everybody) and self.agents == other.agents and self.inner == other.inner
+
+    def __hash__(self):
+        return _structural_hash(self, self.agents, self.inner)
+
+    def __str__(self):
+        return "E[" + ",".join(sorted(str(a) for a in self.agents)) + "]" + str(self.inner)
 
 
 class Diamond:
@@ -104,15 +289,22 @@ class Diamond:
         self.inner = inner
 
     def semantic(self, ks, world_to_test):
-        # MODIFIED for one-night ultimate werewolf: return immediately on finding an example
-        for relation in ks.relations:
-            if relation[0] == world_to_test and self.inner.semantic(ks, relation[1]):
+        # MODIFIED for one-night ultimate werewolf: return immediately on finding an example,
+        # only visiting the successors of world_to_test
+        for successor in ks.successors(None, world_to_test):
+            if self.inner.semantic(ks, successor):
                 return True
         return False
 
+    def extension(self, ks):
+        return ks.preimage(None, ks.extension(self.inner))
+
     def __eq__(self, other):
         return isinstance(other, Diamond) and self.inner == other.inner
 
+    def __hash__(self):
+        return _structural_hash(self, self.inner)
+
     def __str__(self):
         return u"\u25C7" + str(self.inner)
 
@@ -127,15 +319,33 @@ class Diamond_a:
         self.agent = agent
 
     def semantic(self, ks, world_to_test):
-        # MODIFIED for one-night ultimate werewolf: return immediately on finding an example
-        for relation in ks.relations.get(self.agent, {}):
-            if relation[0] == world_to_test and self.inner.semantic(ks, relation[1]):
+        # MODIFIED for one-night ultimate werewolf: return immediately on finding an example,
+        # only visiting the successors of world_to_test. Over a partition, evaluate once per class; worlds in no
+        # class have no successors and are not memoized, as any value (even None) can be a class id.
+        relation = ks.get_relation(self.agent)
+        if isinstance(relation, Partition) and world_to_test in relation.class_of:
+            class_id = relation.class_of[world_to_test]
+            memo = _class_memo(self, ks)
+            if class_id not in memo:
+                memo[class_id] = self._semantic_successors(ks, world_to_test)
+            return memo[class_id]
+        return self._semantic_successors(ks, world_to_test)
+
+    def _semantic_successors(self, ks, world_to_test):
+        for successor in ks.successors(self.agent, world_to_test):
+            if self.inner.semantic(ks, successor):
                 return True
         return False
 
+    def extension(self, ks):
+        return ks.preimage(self.agent, ks.extension(self.inner))
+
     def __eq__(self, other):
         return isinstance(other, Diamond_a) and self.inner == other.inner and self.agent == other.agent
 
+    def __hash__(self):
+        return _structural_hash(self, self.agent, self.inner)
+
     def __str__(self):
         return u"\u25C7[" + str(self.agent) + "]" + str(self.inner)
 
@@ -152,8 +362,15 @@ class Implies:
     def semantic(self, ks, world_to_test):
         return not self.left.semantic(ks, world_to_test) or self.right.semantic(ks, world_to_test)
 
+    def extension(self, ks):
+        return (ks.all_worlds() & ~ks.extension(self.left)) | ks.extension(self.right)
+
     def __eq__(self, other):
-        return self.left == other.left and self.right == other.right
+        # MODIFIED: only formulas of the same type are equal, as they are used as dict keys
+        return isinstance(other, Implies) and self.left == other.left and self.right == other.right
+
+    def __hash__(self):
+        return _structural_hash(self, self.left, self.right)
 
     def __str__(self):
         return "(" + self.left.__str__() + " -> " + self.right.__str__() + ")"
@@ -170,8 +387,15 @@ class Not:
     def semantic(self, ks, world_to_test):
         return not self.inner.semantic(ks, world_to_test)
 
+    def extension(self, ks):
+        return ks.all_worlds() & ~ks.extension(self.inner)
+
     def __eq__(self, other):
-        return self.inner == other.inner
+        # MODIFIED: only formulas of the same type are equal, as they are used as dict keys
+        return isinstance(other, Not) and self.inner == other.inner
+
+    def __hash__(self):
+        return _structural_hash(self, self.inner)
 
     def __str__(self):
         return u"\uFFE2" + str(self.inner)
@@ -189,8 +413,15 @@ class And:
     def semantic(self, ks, world_to_test):
         return self.left.semantic(ks, world_to_test) and self.right.semantic(ks, world_to_test)
 
+    def extension(self, ks):
+        return ks.extension(self.left) & ks.extension(self.right)
+
     def __eq__(self, other):
-        return self.left == other.left and self.right == other.right
+        # MODIFIED: only formulas of the same type are equal, as they are used as dict keys
+        return isinstance(other, And) and self.left == other.left and self.right == other.right
+
+    def __hash__(self):
+        return _structural_hash(self, self.left, self.right)
 
     def __str__(self):
         return "(" + self.left.__str__() + " " + u"\u2227" + " " + self.right.__str__() + ")"
@@ -208,8 +439,256 @@ class Or:
     def semantic(self, ks, world_to_test):
         return self.left.semantic(ks, world_to_test) or self.right.semantic(ks, world_to_test)
 
+    def extension(self, ks):
+        return ks.extension(self.left) | ks.extension(self.right)
+
     def __eq__(self, other):
-        return self.left == other.left and self.right == other.right
+        # MODIFIED: only formulas of the same type are equal, as they are used as dict keys
+        return isinstance(other, Or) and self.left == other.left and self.right == other.right
+
+    def __hash__(self):
+        return _structural_hash(self, self.left, self.right)
 
     def __str__(self):
         return "(" + self.left.__str__() + " " + u"\u2228" + " " + self.right.__str__() + ")"
+
+
+class Update:
+    """
+    Describes the dynamic modality [M, a] of an action model M and one of its
+    actions: the inner formula holds after action a is executed, which is
+    true wherever the precondition of a fails. Action models need a list of
+    actions, which have a name and a precondition, and per agent equivs: a
+    set of pairs of action names or a Partition of them. Formulas with this
+    modality are evaluated on the model before the update, by translation.
+    """
+
+    def __init__(self, action_model, action, inner):
+        self.action_model = action_model
+        self.action = action
+        self.inner = inner
+
+    def semantic(self, ks, world_to_test):
+        return translate(self).semantic(ks, world_to_test)
+
+    def extension(self, ks):
+        return ks.extension(translate(self))
+
+    def __eq__(self, other):
+        return isinstance(other, Update) and self.action_model is other.action_model \
+            and self.action == other.action and self.inner == other.inner
+
+    def __hash__(self):
+        return _structural_hash(self, id(self.action_model), self.action, self.inner)
+
+    def __str__(self):
+        return "[" + str(self.action) + "]" + str(self.inner)
+
+
+def translate(formula):
+    """Returns a formula without Update modalities that is equivalent to the
+    given one, by the reduction axioms of action models. Translations are
+    cached and interned, so subformulas are translated once and shared.
+    Common knowledge and Box_star have no reduction axioms, so they cannot
+    occur inside an Update.
+    """
+    if formula in _translations:
+        # None marks a formula without Update modalities, which is its own translation
+        return _translations[formula] or intern(formula)
+    changed = True
+    if isinstance(formula, Update):
+        result = _update(formula.action_model, formula.action, translate(formula.inner))
+    else:
+        children = {}
+        for attribute in ('inner', 'left', 'right'):
+            child = getattr(formula, attribute, None)
+            if child is not None:
+                children[attribute] = translate(child)
+        result = formula
+        changed = any(getattr(formula, a) != child for a, child in children.items())
+        if changed:
+            result = copy.copy(formula)
+            for attribute in ('_class_memo', '_hash', '_is_canonical'):
+                result.__dict__.pop(attribute, None)
+            for attribute, child in children.items():
+                setattr(result, attribute, child)
+    result = intern(result)
+    # The translation of an unchanged formula is not stored, as it would keep its key alive
+    _translations[formula] = result if changed else None
+    return result
+
+
+def _update(action_model, action, inner):
+    """Returns the translation of [action_model, action] inner, for a canonical
+    formula inner without Update modalities, reducing it only once.
+    """
+    translations = _reductions(action_model).translations
+    key = (action, inner)
+    result = translations.get(key)
+    if result is None:
+        result = intern(_reduce(action_model, action, inner))
+        translations[key] = result
+    return result
+
+
+class _Reductions:
+    """
+    What the translation of Update modalities of one action model needs
+    repeatedly: the translations of [action_model, action] inner by action
+    and canonical inner formula, its actions by name and, per agent, the
+    actions related to each action. It is stored on the action model, so it
+    is freed with it, and assumes the action model doesn't change.
+    """
+
+    def __init__(self, action_model):
+        self.translations = {}
+        self.actions = {action.name: action for action in action_model.actions}
+        self.related = {}
+        for agent, equiv in action_model.equivs.items():
+            if not isinstance(equiv, Partition):
+                related = {}
+                for (a, b) in equiv:
+                    related.setdefault(a, []).append(b)
+                self.related[agent] = related
+
+
+def _reductions(action_model):
+    reductions = getattr(action_model, '_reductions', None)
+    if reductions is None:
+        reductions = _Reductions(action_model)
+        action_model._reductions = reductions
+    return reductions
+
+
+def _reduce(action_model, action, inner):
+    """Returns the translation of [action_model, action] inner, for a canonical
+    formula inner without Update modalities. Its subformulas are reduced by _update(),
+    so each of them is reduced once per action.
+    """
+    precon = _action(action_model, action).precon
+    if isinstance(inner, Atom):
+        # Actions don't change facts
+        return Implies(precon, inner)
+    if isinstance(inner, Not):
+        return Implies(precon, Not(_update(action_model, action, inner.inner)))
+    if isinstance(inner, (And, Or, Implies)):
+        # As an action applies to a world in at most one way, [a] distributes over binary connectives
+        return type(inner)(_update(action_model, action, inner.left), _update(action_model, action, inner.right))
+    if isinstance(inner, (Box_a, Diamond_a)):
+        related = _related_actions(action_model, inner.agent, action)
+        if isinstance(inner, Box_a):
+            # [a]Ki phi <-> (pre(a) -> the conjunction of Ki [b] phi over the actions b that i can't tell from a)
+            parts = [Box_a(inner.agent, _update(action_model, b, inner.inner)) for b in related]
+            return Implies(precon, _fold(And, parts, Or(precon, Not(precon))))
+        # [a]Mi phi <-> (pre(a) -> the disjunction of Mi (pre(b) and [b] phi))
+        parts = [Diamond_a(inner.agent, And(_action(action_model, b).precon,
+                                            _update(action_model, b, inner.inner))) for b in related]
+        return Implies(precon, _fold(Or, parts, And(precon, Not(precon))))
+    if isinstance(inner, (Box, Diamond)):
+        # Action models have no unlabelled relations, so updated worlds have no such successors
+        return Or(precon, Not(precon)) if isinstance(inner, Box) else Not(precon)
+    if isinstance(inner, Everybody):
+        return _fold(And, [_update(action_model, action, intern(Box_a(agent, inner.inner)))
+                           for agent in sorted(inner.agents, key=str)], Or(precon, Not(precon)))
+    raise ValueError("No reduction axiom for " + type(inner).__name__)
+
+
+def _action(action_model, name):
+    return _reductions(action_model).actions[name]
+
+
+def _related_actions(action_model, agent, name):
+    equiv = action_model.equivs.get(agent, ())
+    if isinstance(equiv, Partition):
+        return equiv.get(name)
+    return _reductions(action_model).related.get(agent, {}).get(name, [])
+
+
+def _fold(operator, formulas, empty):
+    if not formulas:
+        return empty
+    result = formulas[0]
+    for formula in formulas[1:]:
+        result = operator(result, formula)
+    return result
+
+
+def compile_formula(formula, ks):
+    """Returns a function from world name to whether the formula holds there,
+    like formula.semantic(ks, world) but as nested closures over world ids,
+    with the atom tests (see KripkeStructure.atom_test()) and successor lists
+    of ks bound in. Compiled subformulas are cached on the structure until it
+    changes, together with their results per world (per class for
+    partitions), so they are shared across formulas, worlds and queries.
+    """
+    ids = ks.world_ids()
+    evaluate = _compile(formula, ks, ids, list(ids), ks._compiled)
+    return lambda world: evaluate(ids[world])
+
+
+def _compile(formula, ks, ids, names, compiled):
+    result = compiled.get(formula)
+    if result is None:
+        result = _compile_node(formula, ks, ids, names, compiled)
+        compiled[formula] = result
+    return result
+
+
+def _compile_node(formula, ks, ids, names, compiled):
+    def sub(child):
+        return _compile(child, ks, ids, names, compiled)
+
+    if isinstance(formula, Atom):
+        return ks.atom_test(formula.name)
+    if isinstance(formula, Not):
+        inner = sub(formula.inner)
+        return lambda i: not inner(i)
+    if isinstance(formula, And):
+        left, right = sub(formula.left), sub(formula.right)
+        return lambda i: left(i) and right(i)
+    if isinstance(formula, Or):
+        left, right = sub(formula.left), sub(formula.right)
+        return lambda i: left(i) or right(i)
+    if isinstance(formula, Implies):
+        left, right = sub(formula.left), sub(formula.right)
+        return lambda i: not left(i) or right(i)
+    if isinstance(formula, (Box, Box_a, Diamond, Diamond_a)):
+        return _compile_modal(formula, ks, ids, names, sub(formula.inner))
+    if isinstance(formula, Everybody):
+        parts = [sub(Box_a(agent, formula.inner)) for agent in formula.agents]
+        return lambda i: all(part(i) for part in parts)
+    if isinstance(formula, Update):
+        return sub(translate(formula))
+    # Box_star, Common and anything else are evaluated once over all worlds
+    bits = ks.extension(formula)
+    return lambda i: bits >> i & 1 == 1
+
+
+def _compile_modal(formula, ks, ids, names, inner):
+    agent = getattr(formula, 'agent', None)
+    universal = isinstance(formula, (Box, Box_a))
+    relation = ks.get_relation(agent)
+    results = {}
+    if isinstance(relation, Partition) and agent is not None:
+        # All worlds of a class have the same successors; worlds in no class
+        # keep their own id
+        class_of = relation.class_of
+        key_of = lambda i: (class_of[names[i]],) if names[i] in class_of else i
+    else:
+        key_of = lambda i: i
+
+    def evaluate(i):
+        key = key_of(i)
+        result = results.get(key)
+        if result is None:
+            # A box holds unless some successor fails, a diamond if some successor holds
+            result = universal
+            for successor in ks.successors(agent, names[i]):
+                if inner(ids[successor]) != universal:
+                    result = not universal
+                    break
+            results[key] = result
+        return result
+
+    return evaluate
+
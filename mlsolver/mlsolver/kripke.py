@@ -4,53 +4,768 @@ Provides a tool to model Kripke structures and solve them in addition to a
 modal logic formula.
 """
 
-import copy
+import hashlib
 
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
 from itertools import chain, combinations
 
 
+_FINGERPRINT_MODULUS = 2 ** 64
+
+
+def _digest(*parts):
+    """Returns a stable 64 bit hash of a tuple of names, independent of the
+    hash randomization of the interpreter.
+    """
+    return int.from_bytes(hashlib.blake2b(repr(parts).encode(), digest_size=8).digest(), 'little')
+
+
+def _true_propositions(world):
+    return tuple(sorted(repr(p) for p, value in world.assignment.items() if value))
+
+
+def _postorder(formulas):
+    """Returns the distinct subformulas of interned formulas, each after all
+    of its own subformulas. Iterative, so deep formulas don't hit the
+    recursion limit.
+    """
+    order = []
+    seen = set()
+    stack = [(formula, False) for formula in reversed(formulas)]
+    while stack:
+        formula, expanded = stack.pop()
+        if expanded:
+            order.append(formula)
+            continue
+        if id(formula) in seen:
+            continue
+        seen.add(id(formula))
+        stack.append((formula, True))
+        for attribute in ('right', 'left', 'inner'):
+            child = getattr(formula, attribute, None)
+            if child is not None and id(child) not in seen:
+                stack.append((child, False))
+    return order
+
+
 class KripkeStructure:
     """
     This class describes a Kripke Frame with it's possible worlds and their
     transition relation.
     """
 
+    # Order-independent fingerprint, kept up to date by remove_node_by_name
+    # once computed, and the per-agent successor hashes it is made of
+    _fingerprint = None
+    _successor_hashes = None
+
     def __init__(self, worlds, relations):
-        if isinstance(worlds, list) or isinstance(worlds, dict):
-            # MODIFIED: self.worlds is now a dictionary nstead of a list
-            self.worlds = {w.name: w for w in worlds}
+        if isinstance(worlds, list) or isinstance(worlds, Mapping):
+            # MODIFIED: self.worlds is now a dictionary nstead of a list. A
+            # mapping from names to worlds is used as is, so it may create
+            # its worlds lazily; it needs a pop() method to remove worlds.
+            self.worlds = worlds if isinstance(worlds, Mapping) else {w.name: w for w in worlds}
             self.relations = relations
+            # Per-agent successor index (world -> successors), built lazily.
+            # The key None indexes an unlabelled set of relations.
+            self._successors = {}
+            self._changed()
         else:
             raise TypeError
 
-    def solve(self, formula):
+    def solve(self, formula, method='exhaustive'):
         """Returns a Kripke structure with minimum sub set of nodes, that each
         of it's nodes forces a given formula.
+
+        The 'exhaustive' method searches the power set of worlds for the
+        smallest set to remove, which takes exponential time. The 'fixpoint'
+        method repeatedly removes the worlds where the formula fails until it
+        holds everywhere, and 'announcement' removes them only once (a public
+        announcement). Both take polynomial time, but their results need not
+        be the largest sub structure where the formula holds everywhere, nor
+        one the exhaustive method would find.
         """
-        # MODIFIED to use dictionary of worlds
+        # MODIFIED to use dictionary of worlds and to support polynomial methods
+        if method == 'fixpoint':
+            return self.solve_fixpoint(formula)
+        if method == 'announcement':
+            return self.announce(formula)
+        if method != 'exhaustive':
+            raise ValueError("Unknown solve method: " + str(method))
+        everywhere = self.all_worlds()
+        ids = self.world_ids()
         for i, subset in enumerate(self.get_power_set_of_worlds()):
-            ks = KripkeStructure(list(self.worlds.values()), copy.deepcopy(self.relations))
-            for element in subset:
-                ks.remove_node_by_name(element)
-            if ks.nodes_not_follow_formula(formula) == []:
-                return ks
+            # Check each candidate on a view instead of on a copy
+            submodel = self.submodel(everywhere & ~sum(1 << ids[name] for name in subset))
+            if submodel.nodes_not_follow_formula(formula) == []:
+                return self.restrict(submodel.worlds)
+
+    def announce(self, formula):
+        """Returns the Kripke structure restricted to the worlds where a
+        formula holds, as after a public announcement of the formula.
+        """
+        return self.restrict(self.names_of(self.extension(formula)))
+
+    def solve_fixpoint(self, formula):
+        """Returns the sub structure where a given formula holds everywhere
+        that is the limit of repeatedly announcing it, removing the worlds
+        where the formula fails until there are none left. Removing worlds can
+        make the formula fail elsewhere, so this need not be the largest such
+        sub structure, and it may be empty.
+        """
+        keep = self.all_worlds()
+        while True:
+            holds = self.submodel(keep).extension(formula)
+            if holds == keep:
+                return self.restrict(self.names_of(keep))
+            keep = holds
+
+    def restrict(self, keep):
+        """Returns a new Kripke structure with only the given worlds (an
+        iterable of names), filtering each relation in one pass.
+        """
+        keep = set(keep)
+        worlds = [world for name, world in self.worlds.items() if name in keep]
+
+        def restricted(relation):
+            if isinstance(relation, Partition):
+                return Partition({w: c for w, c in relation.class_of.items() if w in keep})
+            if isinstance(relation, CSRRelation):
+                return relation.restrict(keep)
+            return set((w, v) for (w, v) in relation if w in keep and v in keep)
+
+        if isinstance(self.relations, dict):
+            relations = {agent: restricted(relation) for agent, relation in self.relations.items()}
+        else:
+            relations = restricted(self.relations)
+        return KripkeStructure(worlds, relations)
+
+    def save(self, path):
+        """Writes this structure to a compact binary file (see
+        mlsolver.storage).
+        """
+        from mlsolver import storage
+        storage.save(self, path)
+        self.stored_path = path
+
+    @staticmethod
+    def load(path, mmap=True):
+        """Reads a structure written by save(). With mmap, the file is
+        memory-mapped and its arrays are used without copying them, and worlds
+        are only created when a query looks them up.
+        """
+        from mlsolver import storage
+        ks = storage.load(path, mmap)
+        ks.stored_path = path
+        return ks
+
+    def to_csr(self):
+        """Returns a copy of this structure sharing its worlds, with every
+        agent's relation that is a set of pairs stored as a CSRRelation over
+        the world ids. Partitions are kept, as they are smaller still.
+        """
+        names = list(self.world_ids())
+
+        def compact(relation):
+            if isinstance(relation, (Partition, CSRRelation)):
+                return relation
+            return CSRRelation.from_pairs(relation, names)
+
+        if isinstance(self.relations, dict):
+            relations = {agent: compact(relation) for agent, relation in self.relations.items()}
+        else:
+            relations = self.relations
+        return KripkeStructure(list(self.worlds.values()), relations)
+
+    def submodel(self, keep):
+        """Returns a view of the sub structure with only the worlds in a
+        bitset, sharing this structure instead of copying it. The view is only
+        valid while this structure does not change.
+        """
+        return Submodel(self, keep)
+
+    def successors(self, agent, world):
+        """Returns the worlds reachable from a world in one step of an
+        agent's relation. Pass None as agent for an unlabelled set of
+        relations.
+        """
+        # MODIFIED for one-night ultimate werewolf: adjacency index instead of scanning all relations
+        index = self._successors.get(agent)
+        if index is None:
+            relation = self.get_relation(agent)
+            if isinstance(relation, (Partition, CSRRelation)):
+                # A partition already maps each world to its class members, and
+                # a CSR relation each world to its successors
+                index = relation
+            else:
+                index = {}
+                for (start_node, end_node) in relation:
+                    index.setdefault(start_node, []).append(end_node)
+            self._successors[agent] = index
+        return index.get(world, ())
+
+    def _changed(self):
+        """Drops everything derived from the worlds and relations. The state
+        object is replaced, so results cached against it can be recognised as
+        stale.
+        """
+        self.state = object()
+        # The file this structure was saved to or loaded from, while unchanged
+        self.stored_path = None
+        self._world_ids = None
+        self._world_names = None
+        self._proposition_index = None
+        self._renaming_fingerprint = None
+        self._compiled = {}
+        self._preimages = {}
+        self._predecessor_names = {}
+        self._extensions = {}
+        self._memo = {}
+        self._groups = {}
+
+    def world_ids(self):
+        """Returns a mapping from world name to the position of its bit in the
+        bitsets returned by extension(). Worlds that number themselves (with
+        world_ids() and world_names() methods that return None when they
+        can't) give their own ids, so they are not all enumerated.
+        """
+        if self._world_ids is None:
+            ids = getattr(self.worlds, 'world_ids', None)
+            ids = ids() if ids is not None else None
+            if ids is None:
+                ids = {name: i for i, name in enumerate(self.worlds)}
+            self._world_ids = ids
+        return self._world_ids
+
+    def all_worlds(self):
+        """Returns the bitset of all worlds.
+        """
+        return (1 << len(self.worlds)) - 1
+
+    def names_of(self, bits):
+        """Returns the names of the worlds in a bitset, in world order. Only
+        the set bits are visited, so this costs the size of the result.
+        """
+        if self._world_names is None:
+            names = getattr(self.worlds, 'world_names', None)
+            names = names() if names is not None else None
+            self._world_names = names if names is not None else list(self.world_ids())
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self._world_names[low.bit_length() - 1])
+            bits ^= low
+        return names
+
+    def extension(self, formula):
+        """Returns the bitset of all worlds where a formula holds. Results are
+        memoized per (sub)formula until the structure changes.
+        """
+        result = self._extensions.get(formula)
+        if result is None:
+            result = formula.extension(self)
+            self._extensions[formula] = result
+        return result
+
+    def atom_extension(self, proposition):
+        """Returns the bitset of all worlds where a propositional variable is
+        assigned true.
+        """
+        return self.proposition_index().get(proposition, 0)
+
+    def atom_test(self, proposition):
+        """Returns a function from world id to whether a propositional
+        variable is assigned true there. Worlds loaded from a file (see
+        mlsolver.storage) are read from their row of its assignment matrix,
+        so only the worlds a query visits are read; otherwise the proposition
+        index is used.
+        """
+        test = getattr(self.worlds, 'atom_test', None)
+        if test is not None and self._proposition_index is None:
+            test = test(proposition)
+            if test is not None:
+                return test
+        bits = self.atom_extension(proposition)
+        return lambda i: bits >> i & 1 == 1
+
+    def proposition_index(self):
+        """Returns the inverted index of the assignments: a dict from every
+        propositional variable to the bitset of worlds where it is true. It is
+        built in one pass over the worlds and kept until the structure
+        changes.
+        """
+        if self._proposition_index is None:
+            index = {}
+            for i, world in enumerate(self.worlds.values()):
+                bit = 1 << i
+                for proposition, value in world.assignment.items():
+                    if value:
+                        index[proposition] = index.get(proposition, 0) | bit
+            self._proposition_index = index
+        return self._proposition_index
+
+    def evaluate(self, formula, world):
+        """Returns whether a formula holds in a world, like its semantic()
+        function, memoized until the structure changes.
+        """
+        key = (formula, world)
+        result = self._memo.get(key)
+        if result is None:
+            result = formula.semantic(self, world)
+            self._memo[key] = result
+        return result
+
+    def agents(self):
+        """Returns the agents of the structure, or [None] for an unlabelled set
+        of relations.
+        """
+        if isinstance(self.relations, set):
+            return [None]
+        return list(self.relations)
+
+    def reachable(self, agents, world, reflexive=False):
+        """Returns the bitset of worlds reachable from a world in one or more
+        steps of the union of the agents' relations, or in zero or more steps
+        if reflexive.
+        """
+        component_of, star, plus = self._group_reach(agents)
+        component = component_of[self.world_ids()[world]]
+        return star[component] if reflexive else plus[component]
+
+    def group_extension(self, agents, bits, reflexive=False):
+        """Returns the bitset of worlds from which only worlds in bits are
+        reachable in one or more steps of the union of the agents' relations,
+        or in zero or more steps if reflexive.
+        """
+        component_of, star, plus = self._group_reach(agents)
+        reach = star if reflexive else plus
+        good = [reach[c] & ~bits == 0 for c in range(len(reach))]
+        return sum(1 << i for i, c in enumerate(component_of) if good[c])
+
+    def _group_reach(self, agents):
+        """Returns, for a group of agents, the component of every world id and
+        the bitsets reachable from each component in zero or more (star) and
+        in one or more (plus) steps. Computed once per group.
+        """
+        group = frozenset(agents)
+        reach = self._groups.get(group)
+        if reach is None:
+            relations = [self.get_relation(agent) for agent in group]
+            if all(isinstance(relation, Partition) for relation in relations):
+                reach = self._partition_components(relations)
+            else:
+                reach = self._strong_components(group)
+            self._groups[group] = reach
+        return reach
+
+    def _partition_components(self, partitions):
+        """Components of a union of equivalence relations, by merging classes.
+        Every world in a class reaches its whole component in one step or more.
+        """
+        ids = self.world_ids()
+        parent = list(range(len(ids)))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        covered = 0
+        for partition in partitions:
+            for members in partition.members.values():
+                member_ids = [ids[w] for w in members if w in ids]
+                for i in member_ids:
+                    covered |= 1 << i
+                    parent[find(i)] = find(member_ids[0])
+        roots = {}
+        component_of = [roots.setdefault(find(i), len(roots)) for i in range(len(ids))]
+        star = [0] * len(roots)
+        for i, component in enumerate(component_of):
+            star[component] |= 1 << i
+        # A world outside every class has no successors
+        plus = [bits if bits & covered else 0 for bits in star]
+        return component_of, star, plus
+
+    def _strong_components(self, group):
+        """Strongly connected components of a union of relations (Tarjan), with
+        the worlds reachable from each, accumulated from sink components up.
+        """
+        ids = self.world_ids()
+        successors = [set() for _ in ids]
+        for agent in group:
+            for name, i in ids.items():
+                successors[i].update(ids[w] for w in self.successors(agent, name) if w in ids)
+
+        index = [None] * len(ids)
+        low = [0] * len(ids)
+        on_stack = [False] * len(ids)
+        stack = []
+        component_of = [None] * len(ids)
+        star = []
+        plus = []
+        counter = 0
+        for root in range(len(ids)):
+            if index[root] is not None:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, iter(successors[root]))]
+            while work:
+                v, remaining = work[-1]
+                for w in remaining:
+                    if index[w] is None:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+                        work.append((w, iter(successors[w])))
+                        break
+                    elif on_stack[w]:
+                        low[v] = min(low[v], index[w])
+                else:
+                    work.pop()
+                    if work:
+                        low[work[-1][0]] = min(low[work[-1][0]], low[v])
+                    if low[v] == index[v]:
+                        # v is the root of a component; every component it
+                        # reaches has already been completed
+                        component = len(star)
+                        members = []
+                        while True:
+                            w = stack.pop()
+                            on_stack[w] = False
+                            component_of[w] = component
+                            members.append(w)
+                            if w == v:
+                                break
+                        bits = sum(1 << w for w in members)
+                        reached = 0
+                        for w in members:
+                            for u in successors[w]:
+                                reached |= star[component_of[u]] if component_of[u] != component else bits
+                        star.append(bits | reached)
+                        plus.append(reached)
+        return component_of, star, plus
+
+    def preimage(self, agent, bits):
+        """Returns the bitset of worlds with at least one successor in bits
+        under an agent's relation (None for an unlabelled set of relations).
+        """
+        index = self._preimages.get(agent)
+        if index is None:
+            index = self._build_preimage_index(agent)
+        result = 0
+        if isinstance(index, tuple):
+            # One bitset per class of a partition
+            for class_bits in index:
+                if class_bits & bits:
+                    result |= class_bits
+            return result
+        # One bitset of predecessors per world
+        while bits:
+            low = bits & -bits
+            result |= index[low.bit_length() - 1]
+            bits ^= low
+        return result
+
+    def _build_preimage_index(self, agent):
+        ids = self.world_ids()
+        relation = self.get_relation(agent)
+        if isinstance(relation, Partition):
+            index = tuple(sum(1 << ids[w] for w in members if w in ids)
+                          for members in relation.members.values())
+        elif isinstance(relation, CSRRelation):
+            # The rows of the transposed matrix as bitsets, read off the arrays
+            index = [0] * len(ids)
+            id_of = [ids.get(name) for name in relation.names]
+            for i, start_id in enumerate(id_of):
+                if start_id is None:
+                    continue
+                bit = 1 << start_id
+                for j in relation.row(i):
+                    if id_of[j] is not None:
+                        index[id_of[j]] |= bit
+        else:
+            index = [0] * len(ids)
+            for (start_node, end_node) in relation:
+                if start_node in ids and end_node in ids:
+                    index[ids[end_node]] |= 1 << ids[start_node]
+        self._preimages[agent] = index
+        return index
+
+    def get_relation(self, agent):
+        """Returns the relation of one agent, or the unlabelled set of
+        relations if agent is None.
+        """
+        if agent is None:
+            return self.relations if isinstance(self.relations, set) else ()
+        if isinstance(self.relations, dict):
+            return self.relations.get(agent, ())
+        return ()
 
     def remove_node_by_name(self, node_name):
         """Removes ONE node of Kripke frame, therefore we can make knowledge
         base consistent with announcement.
         """
+        # MODIFIED to keep the successor index and fingerprint up to date
+        if self._fingerprint is not None:
+            self._remove_from_fingerprint(node_name)
         self.worlds.pop(node_name)
+        self._changed()
 
         if isinstance(self.relations, set):
-            for (start_node, end_node) in self.relations.copy():
-                if start_node == node_name or end_node == node_name:
-                    self.relations.remove((start_node, end_node))
+            self._remove_edges(None, self.relations, node_name)
 
         if isinstance(self.relations, dict):
             for key, value in self.relations.items():
-                for (start_node, end_node) in value.copy():
-                    if start_node == node_name or end_node == node_name:
-                        value.remove((start_node, end_node))
+                if isinstance(value, (Partition, CSRRelation)):
+                    value.remove(node_name)
+                else:
+                    self._remove_edges(key, value, node_name)
+
+    def _remove_edges(self, agent, relation, node_name):
+        """Removes all edges from and to a node from one relation and its
+        successor index.
+        """
+        index = self._successors.get(agent)
+        if index is not None:
+            index.pop(node_name, None)
+        for (start_node, end_node) in relation.copy():
+            if start_node == node_name or end_node == node_name:
+                relation.remove((start_node, end_node))
+                if index is not None and start_node != node_name:
+                    index[start_node].remove(end_node)
+
+    def bisimulation_contraction(self):
+        """Returns the smallest Kripke structure bisimilar to this one. It has
+        one world for each class of bisimilar worlds, named after the first
+        world of the class and carrying its assignment.
+        """
+        agents = [None] if isinstance(self.relations, set) else list(self.relations)
+
+        # Start from the worlds grouped by their assignment
+        blocks = []
+        block_of = {}
+        by_assignment = {}
+        for name, world in self.worlds.items():
+            key = frozenset(p for p, value in world.assignment.items() if value)
+            if key not in by_assignment:
+                by_assignment[key] = len(blocks)
+                blocks.append(set())
+            block_of[name] = by_assignment[key]
+            blocks[block_of[name]].add(name)
+
+        # Refine by Paige and Tarjan's algorithm. The blocks are grouped into
+        # compound blocks, and every block is stable with respect to every
+        # compound block: for each agent, either all or none of its worlds
+        # have a successor in it. A compound block S of several blocks is
+        # split into a block B of at most half its worlds and the rest, and
+        # the blocks are split by whether their worlds have successors in B,
+        # in S - B or in both. The number of successors each world has in each
+        # compound block tells the latter apart without visiting S - B, so
+        # every world is in a splitter only logarithmically often.
+        compound_of = [0] * len(blocks)
+        compounds = [list(range(len(blocks)))]
+        queue = [0] if len(blocks) > 1 else []
+        queued = set(queue)
+
+        # All members of a class of a partition have the same successors, so
+        # for partitions the worlds of each block are also kept by class, in
+        # cells shared by cells[agent][class_id][block] and
+        # block_cells[agent][block][class_id], and blocks are split by class.
+        # Only blocks with worlds of several classes can be split that way, so
+        # they are indexed by class in mixed[agent][class_id]. Worlds in no
+        # class are kept in a class of their own.
+        class_at = {}
+        for agent in agents:
+            relation = self.get_relation(agent)
+            if isinstance(relation, Partition):
+                class_of = relation.class_of
+                class_at[agent] = {name: class_of[name] if name in class_of else _NO_CLASS for name in self.worlds}
+        cells = {agent: {} for agent in class_at}
+        block_cells = {agent: [{} for _ in blocks] for agent in class_at}
+        mixed = {agent: {} for agent in class_at}
+
+        def cell(agent, class_id, block):
+            by_block = cells[agent].setdefault(class_id, {})
+            members = by_block.get(block)
+            if members is None:
+                members = set()
+                by_block[block] = members
+                here = block_cells[agent][block]
+                here[class_id] = members
+                for other in (here if len(here) == 2 else [class_id] if len(here) > 2 else []):
+                    mixed[agent].setdefault(other, set()).add(block)
+            return members
+
+        def drop_cell(agent, class_id, block):
+            del cells[agent][class_id][block]
+            here = block_cells[agent][block]
+            del here[class_id]
+            if here:
+                mixed[agent][class_id].discard(block)
+                if len(here) == 1:
+                    for other in here:
+                        mixed[agent][other].discard(block)
+
+        for agent, classes in class_at.items():
+            for name, class_id in classes.items():
+                cell(agent, class_id, block_of[name]).add(name)
+
+        def move(block, moving):
+            # Moves some worlds of a block to a new block of the same compound block
+            new = len(blocks)
+            blocks[block].difference_update(moving)
+            blocks.append(set(moving))
+            for name in moving:
+                block_of[name] = new
+            for agent, classes in class_at.items():
+                block_cells[agent].append({})
+                for name in moving:
+                    class_id = classes[name]
+                    old = cells[agent][class_id][block]
+                    old.discard(name)
+                    if not old:
+                        drop_cell(agent, class_id, block)
+                    cell(agent, class_id, new).add(name)
+            compound = compound_of[block]
+            compound_of.append(compound)
+            compounds[compound].append(new)
+            if compound not in queued:
+                queue.append(compound)
+                queued.add(compound)
+
+        def split(marked):
+            # Splits blocks by the given worlds, moving the smaller part
+            touched = {}
+            for name in marked:
+                touched.setdefault(block_of[name], []).append(name)
+            for block, inside in touched.items():
+                size = len(blocks[block])
+                if len(inside) < size:
+                    move(block, inside if 2 * len(inside) <= size else blocks[block].difference(inside))
+
+        def split_classes(agent, class_ids):
+            # Splits blocks by the worlds of the given classes, moving the smaller part
+            touched = {}
+            for class_id in class_ids:
+                for block in mixed[agent].get(class_id, ()):
+                    touched.setdefault(block, []).append(class_id)
+            for block, inside in touched.items():
+                here = block_cells[agent][block]
+                marked = sum(len(here[class_id]) for class_id in inside)
+                if marked == len(blocks[block]):
+                    continue
+                if 2 * marked <= len(blocks[block]):
+                    moving = [name for class_id in inside for name in here[class_id]]
+                else:
+                    inside = set(inside)
+                    moving = [name for class_id, members in here.items() if class_id not in inside
+                              for name in members]
+                move(block, moving)
+
+        def successor_counts(agent, block):
+            # For the worlds (classes for a partition) with successors in a
+            # block, how many they have there
+            if agent in class_at:
+                return {class_id: len(members) for class_id, members in block_cells[agent][block].items()
+                        if class_id is not _NO_CLASS}
+            return self._successor_counts(agent, blocks[block])
+
+        def split_by(agent, keys):
+            if agent in class_at:
+                split_classes(agent, keys)
+            else:
+                split(keys)
+
+        # Per agent and compound block, the number of successors in it
+        counts = {}
+        for agent in agents:
+            if agent in class_at:
+                everywhere = {}
+                for class_id in class_at[agent].values():
+                    if class_id is not _NO_CLASS:
+                        everywhere[class_id] = everywhere.get(class_id, 0) + 1
+            else:
+                everywhere = self._successor_counts(agent, self.worlds)
+            counts[agent] = [everywhere]
+            split_by(agent, list(everywhere))
+
+        while queue:
+            compound = queue.pop()
+            queued.discard(compound)
+            members = compounds[compound]
+            first, second = members[0], members[1]
+            splitter = first if len(blocks[first]) <= len(blocks[second]) else second
+            members.remove(splitter)
+            compound_of[splitter] = len(compounds)
+            compounds.append([splitter])
+            if len(members) > 1:
+                queue.append(compound)
+                queued.add(compound)
+            # Counted before any split, as the splitter itself may be split
+            in_splitter = {agent: successor_counts(agent, splitter) for agent in agents}
+            for agent in agents:
+                in_compound = counts[agent][compound]
+                split_by(agent, list(in_splitter[agent]))
+                # Worlds with successors in B but none in S - B
+                split_by(agent, [key for key, count in in_splitter[agent].items() if count == in_compound[key]])
+                for key, count in in_splitter[agent].items():
+                    if count == in_compound[key]:
+                        del in_compound[key]
+                    else:
+                        in_compound[key] -= count
+                counts[agent].append(in_splitter[agent])
+
+        representative = {}
+        for name in self.worlds:
+            representative.setdefault(block_of[name], name)
+        worlds = [self.worlds[name] for name in representative.values()]
+
+        def contract(agent, relation):
+            if isinstance(relation, Partition):
+                # Bisimilar worlds see the same blocks, so the blocks seen from
+                # a class identify its class in the contracted structure.
+                class_ids = {}
+                class_of = {}
+                for members in relation.members.values():
+                    seen = frozenset(block_of[name] for name in members if name in block_of)
+                    for name in members:
+                        if name in block_of and representative[block_of[name]] == name:
+                            class_of[name] = class_ids.setdefault(seen, len(class_ids))
+                return Partition(class_of)
+            pairs = set((representative[block_of[start_node]], representative[block_of[end_node]])
+                        for (start_node, end_node) in relation
+                        if start_node in block_of and end_node in block_of)
+            if isinstance(relation, CSRRelation):
+                return CSRRelation.from_pairs(pairs, [world.name for world in worlds])
+            return pairs
+
+        if isinstance(self.relations, set):
+            return KripkeStructure(worlds, contract(None, self.relations))
+        return KripkeStructure(worlds, {agent: contract(agent, relation) for agent, relation in self.relations.items()})
+
+    def _successor_counts(self, agent, names):
+        """Returns, for the worlds with at least one successor among the given
+        worlds, how many they have there.
+        """
+        index = self._predecessor_names.get(agent)
+        if index is None:
+            index = {}
+            for (start_node, end_node) in self.get_relation(agent):
+                if start_node in self.worlds:
+                    index.setdefault(end_node, []).append(start_node)
+            self._predecessor_names[agent] = index
+        counts = {}
+        for name in names:
+            for start_node in index.get(name, ()):
+                counts[start_node] = counts.get(start_node, 0) + 1
+        return counts
 
     def get_power_set_of_worlds(self):
         """Returns a list with all possible sub sets of world names, sorted
@@ -71,39 +786,140 @@ class KripkeStructure:
         """Returns a list with all worlds of Kripke structure, where formula
          is not satisfiable
         """
-        # MODIFIED to use dictionary of worlds
-        nodes_not_follow_formula = []
-        for nodes in self.worlds.values():
-            if not formula.semantic(self, nodes.name):
-                nodes_not_follow_formula.append(nodes.name)
-        return nodes_not_follow_formula
+        # MODIFIED to evaluate the formula once over all worlds instead of once per world
+        return self.names_of(self.all_worlds() & ~self.extension(formula))
+
+    def extensions(self, formulas):
+        """Returns the bitset of worlds where each of the given formulas holds,
+        in the same order. The formulas are interned into one DAG, and every
+        distinct subformula is evaluated exactly once, bottom-up, so the cost
+        grows with the number of distinct subformulas rather than with the
+        total size of the formulas.
+        """
+        from mlsolver.formula import intern
+        formulas = [intern(formula) for formula in formulas]
+        for subformula in _postorder(formulas):
+            # Its subformulas are already evaluated, so this does not recurse
+            self.extension(subformula)
+        return [self.extension(formula) for formula in formulas]
+
+    def nodes_not_follow_formulas(self, formulas):
+        """Returns, for each of the given formulas, the list of worlds where it
+        does not hold, evaluating shared subformulas once (see extensions()).
+        """
+        everywhere = self.all_worlds()
+        return [self.names_of(everywhere & ~bits) for bits in self.extensions(formulas)]
+
+    def fingerprint(self, up_to_renaming=False):
+        """Returns a 64 bit hash of the worlds, their assignments and the
+        relations, which does not depend on the order of worlds or pairs or on
+        how relations are stored. It is computed once and then updated as
+        worlds are removed. With up_to_renaming, world names are ignored, so
+        isomorphic structures have the same fingerprint (as do some others).
+        """
+        if up_to_renaming:
+            if self._renaming_fingerprint is None:
+                self._renaming_fingerprint = self._compute_renaming_fingerprint()
+            return self._renaming_fingerprint
+        if self._fingerprint is None:
+            self._fingerprint = self._compute_fingerprint()
+        return self._fingerprint
+
+    def _compute_fingerprint(self):
+        # The sum of a hash per world and a hash per world and agent of the
+        # set of its successors, which is itself a sum of a hash per successor
+        total = sum(_digest('world', name, _true_propositions(world)) for name, world in self.worlds.items())
+        self._successor_hashes = {}
+        for agent in self.agents():
+            relation = self.get_relation(agent)
+            successors = {}
+            if isinstance(relation, Partition):
+                for members in relation.members.values():
+                    class_hash = (sum(_digest('name', v) for v in members) % _FINGERPRINT_MODULUS, len(members))
+                    for w in members:
+                        successors[w] = class_hash
+            else:
+                for (w, v) in relation:
+                    (h, count) = successors.get(w, (0, 0))
+                    successors[w] = ((h + _digest('name', v)) % _FINGERPRINT_MODULUS, count + 1)
+            self._successor_hashes[agent] = successors
+            total += sum(_digest('successors', agent, w, h) for w, (h, _) in successors.items())
+        return total % _FINGERPRINT_MODULUS
+
+    def _remove_from_fingerprint(self, name):
+        total = self._fingerprint - _digest('world', name, _true_propositions(self.worlds[name]))
+        name_hash = _digest('name', name)
+        for agent, successors in self._successor_hashes.items():
+            if name in successors:
+                total -= _digest('successors', agent, name, successors.pop(name)[0])
+            relation = self.get_relation(agent)
+            if isinstance(relation, Partition):
+                predecessors = list(relation.get(name))
+            else:
+                predecessors = [w for (w, v) in relation if v == name]
+            for w in predecessors:
+                if w == name or w not in successors:
+                    continue
+                (h, count) = successors[w]
+                total -= _digest('successors', agent, w, h)
+                h = (h - name_hash) % _FINGERPRINT_MODULUS
+                if count > 1:
+                    successors[w] = (h, count - 1)
+                    total += _digest('successors', agent, w, h)
+                else:
+                    del successors[w]
+        self._fingerprint = total % _FINGERPRINT_MODULUS
+
+    def _compute_renaming_fingerprint(self):
+        # Colour refinement (1-dimensional Weisfeiler-Leman): worlds start with
+        # the colour of their assignment, and are recoloured by the multiset of
+        # their successors' colours per agent until no colour class splits
+        agents = self.agents()
+        colours = {name: _digest('world', _true_propositions(world)) for name, world in self.worlds.items()}
+        for _ in range(len(colours)):
+            refined = {}
+            for name, colour in colours.items():
+                signature = [colour]
+                for agent in agents:
+                    signature.append(sum(_digest('colour', colours[v]) for v in self.successors(agent, name)
+                                         if v in colours) % _FINGERPRINT_MODULUS)
+                refined[name] = _digest(*signature)
+            split = len(set(refined.values())) > len(set(colours.values()))
+            colours = refined
+            if not split:
+                break
+        return sum(_digest('colour', colour) for colour in colours.values()) % _FINGERPRINT_MODULUS
 
     def __eq__(self, other):
         """Returns true iff two Kripke structures are equivalent
         """
-        # MODIFIED to use dictionary of worlds
-        if (self.worlds == {} and not other.worlds == {}) \
-                or (not self.worlds == {} and other.worlds == {}):
+        # MODIFIED to compare fingerprints first, and to not depend on the
+        # order of worlds and pairs
+        if not isinstance(other, KripkeStructure):
+            return NotImplemented
+        if isinstance(other, Submodel):
+            return other == self
+        if self.fingerprint() != other.fingerprint():
             return False
-        for (i, j) in zip(self.worlds.values(), other.worlds.values()):
-            if not i.__eq__(j):
+        if set(self.worlds) != set(other.worlds):
+            return False
+        for name, world in self.worlds.items():
+            if not world.__eq__(other.worlds[name]):
                 return False
-
-        if isinstance(self.relations, set):
-            for (i, j) in zip(self.relations, other.relations):
-                if not i == j:
+        for agent in set(self.agents()) | set(other.agents()):
+            relation = self.get_relation(agent)
+            other_relation = other.get_relation(agent)
+            if isinstance(relation, Partition) or isinstance(other_relation, Partition):
+                if not (relation == other_relation if isinstance(relation, Partition) else other_relation == relation):
                     return False
-
-        if isinstance(self.relations, dict):
-            for key, value in self.relations.items():
-                try:
-                    if not value == other.relations[key]:
-                        return False
-                except KeyError:
-                    if not value == set():
-                        return False
+            elif set(relation) != set(other_relation):
+                return False
         return True
 
+    def __hash__(self):
+        # Only valid while the structure is not changed
+        return self.fingerprint()
+
     def __str__(self):
         # MODIFIED to use dictionary of worlds
         worlds_str = "(W = {"
@@ -112,12 +928,266 @@ class KripkeStructure:
         return worlds_str + '}, R = ' + str(self.relations) + ')'
 
 
+class Submodel(KripkeStructure):
+    """
+    A view of a Kripke structure restricted to the worlds in a bitset (the
+    mask), without copying its worlds or relations. World ids are those of
+    the base structure, so bitsets can be exchanged with it, and every
+    formula is evaluated as on the restricted structure.
+    """
+
+    def __init__(self, base, mask):
+        self.base = base
+        self.mask = mask & base.all_worlds()
+        self.worlds = _MaskedWorlds(self)
+        self.relations = base.relations
+        self._successors = {}
+        self._changed()
+
+    def world_ids(self):
+        return self.base.world_ids()
+
+    def all_worlds(self):
+        return self.mask
+
+    def atom_extension(self, proposition):
+        return self.base.atom_extension(proposition) & self.mask
+
+    def successors(self, agent, world):
+        ids = self.world_ids()
+        return [v for v in self.base.successors(agent, world) if self.mask >> ids[v] & 1]
+
+    def preimage(self, agent, bits):
+        return self.base.preimage(agent, bits & self.mask) & self.mask
+
+    def reachable(self, agents, world, reflexive=False):
+        start = 1 << self.world_ids()[world]
+        reached = 0
+        frontier = start
+        while frontier:
+            step = 0
+            while frontier:
+                low = frontier & -frontier
+                for agent in agents:
+                    step |= self._successor_bits(agent, low.bit_length() - 1)
+                frontier ^= low
+            frontier = step & ~reached
+            reached |= step
+        return reached | start if reflexive else reached
+
+    def _successor_bits(self, agent, i):
+        ids = self.world_ids()
+        name = self.names_of(1 << i)[0]
+        return sum(1 << ids[v] for v in self.successors(agent, name))
+
+    def group_extension(self, agents, bits, reflexive=False):
+        # Greatest fixpoint of the worlds whose successors are all in bits and in the fixpoint
+        result = self.mask
+        while True:
+            step = self.mask
+            for agent in agents:
+                step &= ~self.preimage(agent, self.mask & ~(bits & result))
+            if step == result:
+                return bits & result if reflexive else result
+            result = step
+
+    def remove_node_by_name(self, node_name):
+        raise TypeError("A submodel view cannot be changed, restrict() it to a copy instead")
+
+    def bisimulation_contraction(self):
+        return self.restrict(self.worlds).bisimulation_contraction()
+
+    def fingerprint(self, up_to_renaming=False):
+        return self.restrict(self.worlds).fingerprint(up_to_renaming)
+
+    def __eq__(self, other):
+        if isinstance(other, Submodel):
+            other = other.restrict(other.worlds)
+        return self.restrict(self.worlds) == other
+
+    def __hash__(self):
+        return self.fingerprint()
+
+    def restrict(self, keep):
+        return self.base.restrict(set(keep) & set(self.worlds))
+
+    def submodel(self, keep):
+        return Submodel(self.base, self.mask & keep)
+
+
+class _MaskedWorlds(Mapping):
+    """
+    The worlds of a Submodel by name.
+    """
+
+    def __init__(self, view):
+        self.view = view
+
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        return self.view.base.worlds[name]
+
+    def __contains__(self, name):
+        i = self.view.world_ids().get(name)
+        return i is not None and self.view.mask >> i & 1 == 1
+
+    def __iter__(self):
+        return iter(self.view.names_of(self.view.mask))
+
+    def __len__(self):
+        return bin(self.view.mask).count('1')
+
+
+class UpdatedKripkeStructure:
+    """
+    Describes the product of a Kripke structure with an action model without
+    building it. Its worlds are named by tuples (world, action, ...) of a base
+    world and the actions applied to it, and only the worlds and successors
+    that formula evaluation visits are generated, with memoization. Action
+    models need a list of actions, which have a name and a precondition, and
+    per agent equivs: a set of pairs of action names or a Partition of them.
+
+    Formulas are evaluated with evaluate() or semantic(); Box_star and Common
+    need the whole structure, so evaluate them on materialize() instead.
+    """
+
+    def __init__(self, base, action_models):
+        action_models = list(action_models)
+        if not action_models:
+            raise ValueError("At least one action model is needed")
+        # The structure updated by all but the last action model
+        self.prior = base if len(action_models) == 1 else UpdatedKripkeStructure(base, action_models[:-1])
+        self.base = base
+        self.action_model = action_models[-1]
+        self.actions = {action.name: action for action in self.action_model.actions}
+        self.worlds = _UpdatedWorlds(self)
+        self.state = object()
+        self._memo = {}
+        self._successors = {}
+        self._action_successors = {}
+
+    def split(self, name):
+        """Returns the name of a world in the prior structure and the name of
+        the action applied to it.
+        """
+        prior_name = name[:-1] if isinstance(self.prior, UpdatedKripkeStructure) else name[0]
+        return prior_name, name[-1]
+
+    def join(self, prior_name, action_name):
+        """Returns the name of the world given by applying an action to a world
+        of the prior structure.
+        """
+        if isinstance(self.prior, UpdatedKripkeStructure):
+            return prior_name + (action_name,)
+        return prior_name, action_name
+
+    def agents(self):
+        return [agent for agent in self.prior.agents() if agent is not None]
+
+    def get_relation(self, agent):
+        # The relations are only known per world, through successors()
+        return ()
+
+    def evaluate(self, formula, world):
+        """Returns whether a formula holds in a world, memoized.
+        """
+        key = (formula, world)
+        result = self._memo.get(key)
+        if result is None:
+            result = formula.semantic(self, world)
+            self._memo[key] = result
+        return result
+
+    def successors(self, agent, world):
+        """Returns the worlds reachable from a world in one step of an
+        agent's relation: the worlds related in the prior structure, with
+        related actions whose precondition holds there.
+        """
+        key = (agent, world)
+        result = self._successors.get(key)
+        if result is None:
+            prior_name, action_name = self.split(world)
+            result = [self.join(v, b)
+                      for v in self.prior.successors(agent, prior_name)
+                      for b in self._related_actions(agent, action_name)
+                      if self.prior.evaluate(self.actions[b].precon, v)]
+            self._successors[key] = result
+        return result
+
+    def _related_actions(self, agent, action_name):
+        index = self._action_successors.get(agent)
+        if index is None:
+            equiv = self.action_model.equivs.get(agent, ())
+            if isinstance(equiv, Partition):
+                index = equiv
+            else:
+                index = {}
+                for (a, b) in equiv:
+                    index.setdefault(a, []).append(b)
+            self._action_successors[agent] = index
+        return index.get(action_name, ())
+
+    def materialize(self):
+        """Returns the whole product as a KripkeStructure.
+        """
+        worlds = list(self.worlds.values())
+        names = set(w.name for w in worlds)
+        relations = {agent: set((w.name, v) for w in worlds for v in self.successors(agent, w.name) if v in names)
+                     for agent in self.agents()}
+        return KripkeStructure(worlds, relations)
+
+
+class _UpdatedWorlds(Mapping):
+    """
+    The worlds of an UpdatedKripkeStructure by name, created when they are
+    first looked up. Iterating enumerates the whole product.
+    """
+
+    def __init__(self, ks):
+        self.ks = ks
+        self.created = {}
+
+    def __getitem__(self, name):
+        world = self.created.get(name)
+        if world is None:
+            if name not in self:
+                raise KeyError(name)
+            # Actions don't change facts, so worlds keep the assignment of their prior world
+            world = World(name, self.ks.prior.worlds[self.ks.split(name)[0]].assignment)
+            self.created[name] = world
+        return world
+
+    def __contains__(self, name):
+        if name in self.created:
+            return True
+        if not isinstance(name, tuple) or len(name) < 2:
+            return False
+        prior_name, action_name = self.ks.split(name)
+        action = self.ks.actions.get(action_name)
+        return action is not None and prior_name in self.ks.prior.worlds \
+            and self.ks.prior.evaluate(action.precon, prior_name)
+
+    def __iter__(self):
+        for prior_name in self.ks.prior.worlds:
+            for action in self.ks.action_model.actions:
+                if self.ks.prior.evaluate(action.precon, prior_name):
+                    yield self.ks.join(prior_name, action.name)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
 class World:
     """
     Represents the nodes of Kripke and it extends the graph to Kripke
     Structure by assigning a subset of propositional variables to each world.
+    The assignment is a dict, or a BitAssignment for compact worlds.
     """
 
+    # MODIFIED: slots instead of a __dict__, so that large models take less memory per world
+    __slots__ = ('name', 'assignment')
+
     def __init__(self, name, assignment):
         self.name = name
         self.assignment = assignment
@@ -127,3 +1197,259 @@ class World:
 
     def __str__(self):
         return "(" + self.name + ',' + str(self.assignment) + ')'
+
+
+# Class of the worlds that are in no class of a partition
+_NO_CLASS = object()
+
+
+class Partition:
+    """
+    Describes an equivalence (S5) relation of one agent by its classes
+    instead of by all of its pairs. Each world is mapped to a class id and
+    each class id to the list of its members, so memory is linear in the
+    number of worlds. It behaves like the set of pairs it represents.
+    """
+
+    def __init__(self, class_of, members=None):
+        self.class_of = class_of
+        if members is None:
+            members = {}
+            for world, class_id in class_of.items():
+                members.setdefault(class_id, []).append(world)
+        self.members = members
+
+    @classmethod
+    def by_key(cls, worlds, key):
+        """Returns the partition of the given world names, where two worlds
+        are related iff key maps them to the same value.
+        """
+        return cls({world: key(world) for world in worlds})
+
+    @classmethod
+    def from_pairs(cls, pairs, elements=()):
+        """Returns the partition given by a set of pairs, or None if the pairs
+        do not form an equivalence relation over the elements they mention
+        and the given elements.
+        """
+        successors = {element: set() for element in elements}
+        for (start_node, end_node) in pairs:
+            successors.setdefault(start_node, set()).add(end_node)
+            successors.setdefault(end_node, set())
+        classes = {}
+        for element, element_successors in successors.items():
+            classes.setdefault(frozenset(element_successors), []).append(element)
+        # Equivalent iff every element's successors are exactly its class
+        for key, members in classes.items():
+            if len(key) != len(members) or not key.issuperset(members):
+                return None
+        return cls({element: class_id for class_id, members in enumerate(classes.values()) for element in members},
+                   {class_id: members for class_id, members in enumerate(classes.values())})
+
+    def get(self, world, default=()):
+        """Returns the members of the class of a world, which are exactly its
+        successors.
+        """
+        if world not in self.class_of:
+            return default
+        return self.members[self.class_of[world]]
+
+    def remove(self, world):
+        """Removes a world from its class, if it is in one.
+        """
+        class_id = self.class_of.pop(world, _NO_CLASS)
+        if class_id is _NO_CLASS:
+            return
+        members = self.members[class_id]
+        members.remove(world)
+        if not members:
+            del self.members[class_id]
+
+    def __contains__(self, pair):
+        # Any value can be a class id, including None
+        return pair[0] in self.class_of and pair[1] in self.class_of and \
+            self.class_of[pair[0]] == self.class_of[pair[1]]
+
+    def __iter__(self):
+        for members in self.members.values():
+            for start_node in members:
+                for end_node in members:
+                    yield (start_node, end_node)
+
+    def __len__(self):
+        return sum(len(members) ** 2 for members in self.members.values())
+
+    def __eq__(self, other):
+        if isinstance(other, Partition):
+            return {frozenset(m) for m in self.members.values()} == \
+                   {frozenset(m) for m in other.members.values()}
+        return set(self) == set(other)
+
+    def __str__(self):
+        return str([members for members in self.members.values()])
+
+
+class CSRRelation:
+    """
+    Describes the relation of one agent in compressed sparse row form over
+    integer world ids: the successors of world i are the ids
+    indices[indptr[i]:indptr[i + 1]], in ascending order, and names maps ids
+    back to world names. The ids are stored in arrays of machine integers,
+    which takes a few bytes per pair instead of a tuple of names. The arrays
+    may also be memoryviews, e.g. of a memory-mapped file. It behaves like the
+    set of pairs it represents.
+    """
+
+    def __init__(self, names, indptr, indices, ids=None):
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)} if ids is None else ids
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_pairs(cls, pairs, names):
+        """Returns the relation given by pairs of world names, over the given
+        list of names (by id), which must contain every world of a pair.
+        """
+        names = list(names)
+        ids = {name: i for i, name in enumerate(names)}
+        rows = [[] for _ in names]
+        for (start_node, end_node) in pairs:
+            rows[ids[start_node]].append(ids[end_node])
+        indptr = array('q', [0])
+        indices = array('i')
+        for row in rows:
+            indices.extend(sorted(set(row)))
+            indptr.append(len(indices))
+        return cls(names, indptr, indices)
+
+    def row(self, i):
+        """Returns the successor ids of the world with id i.
+        """
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def get(self, world, default=()):
+        """Returns the names of the successors of a world.
+        """
+        i = self.ids.get(world)
+        if i is None:
+            return default
+        return [self.names[j] for j in self.row(i)]
+
+    def remove(self, world):
+        """Removes a world and every pair with it, renumbering the other
+        worlds.
+        """
+        self.__dict__.update(self.restrict(name for name in self.names if name != world).__dict__)
+
+    def restrict(self, keep):
+        """Returns the relation between the given worlds only, in one pass.
+        """
+        keep = set(keep)
+        names = [name for name in self.names if name in keep]
+        new_id = {self.ids[name]: i for i, name in enumerate(names)}
+        indptr = array('q', [0])
+        indices = array('i')
+        for name in names:
+            indices.extend(new_id[j] for j in self.row(self.ids[name]) if j in new_id)
+            indptr.append(len(indices))
+        return CSRRelation(names, indptr, indices)
+
+    def __contains__(self, pair):
+        i = self.ids.get(pair[0])
+        j = self.ids.get(pair[1])
+        if i is None or j is None:
+            return False
+        start, end = self.indptr[i], self.indptr[i + 1]
+        k = bisect_left(self.indices, j, start, end)
+        return k < end and self.indices[k] == j
+
+    def __iter__(self):
+        for i, start_node in enumerate(self.names):
+            for j in self.row(i):
+                yield (start_node, self.names[j])
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __eq__(self, other):
+        return set(self) == set(other)
+
+    def __str__(self):
+        return str(set(self))
+
+
+class Vocabulary:
+    """
+    Interns propositional variables to bit positions, so that the assignments
+    of many worlds can be stored as integers sharing one vocabulary.
+    """
+
+    def __init__(self, propositions=()):
+        self.bit_of = {}
+        self.propositions = []
+        for proposition in propositions:
+            self.intern(proposition)
+
+    def intern(self, proposition):
+        """Returns the bit position of a variable, adding it if it is new.
+        """
+        bit = self.bit_of.get(proposition)
+        if bit is None:
+            bit = len(self.propositions)
+            self.bit_of[proposition] = bit
+            self.propositions.append(proposition)
+        return bit
+
+    def assignment(self, true_propositions):
+        """Returns the assignment making exactly the given variables true.
+        """
+        bits = 0
+        for proposition in true_propositions:
+            bits |= 1 << self.intern(proposition)
+        return BitAssignment(bits, self)
+
+
+class BitAssignment(Mapping):
+    """
+    Assignment of a world stored as an integer, with one bit per variable of
+    a shared Vocabulary. It reads like a dict mapping the true variables to
+    True.
+    """
+
+    __slots__ = ('bits', 'vocabulary')
+
+    def __init__(self, bits, vocabulary):
+        self.bits = bits
+        self.vocabulary = vocabulary
+
+    def get(self, proposition, default=None):
+        bit = self.vocabulary.bit_of.get(proposition)
+        if bit is not None and self.bits >> bit & 1:
+            return True
+        return default
+
+    def __getitem__(self, proposition):
+        if self.get(proposition, False):
+            return True
+        raise KeyError(proposition)
+
+    def __iter__(self):
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield self.vocabulary.propositions[low.bit_length() - 1]
+            bits ^= low
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __eq__(self, other):
+        if isinstance(other, BitAssignment) and other.vocabulary is self.vocabulary:
+            return self.bits == other.bits
+        return Mapping.__eq__(self, other)
+
+    def __str__(self):
+        return str(dict(self))
+
+    __repr__ = __str__
@@ -0,0 +1,136 @@
+"""Parallel module
+
+Evaluates formulas over the worlds of a Kripke structure in several processes.
+The structure is written once to a file (see mlsolver.storage) that every
+worker memory-maps, so it is not pickled per task and the workers share its
+pages. The worlds are split into shards of consecutive world ids. Each worker
+evaluates the formulas over its shards as bitsets, reading the assignments of
+the shard's worlds only, and the bitsets of the shards are merged into one
+per formula.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from concurrent.futures import ProcessPoolExecutor
+
+from mlsolver import storage
+from mlsolver.kripke import KripkeStructure, _postorder
+
+# Below this number of worlds, starting the workers costs more than it saves. Measured on the ttttwwsmmf game of
+# src/werewolves.py with its model stored: evaluating the 45 to 450 preconditions of an action model serially takes
+# about 17 microseconds per world, and starting a pool whose workers each load the model about 10 ms plus 5 ms per
+# worker. With 32 workers that is only made up for from about 10000 worlds on, with fewer workers sooner.
+# Saving a model just for the workers takes longer than evaluating it serially, so it pays to reuse its file.
+PARALLEL_THRESHOLD = 10000
+_SHARDS_PER_WORKER = 4
+
+# The model loaded in a worker process, by path and modification time
+_loaded = {}
+
+
+def extensions(ks, formulas, workers=None, threshold=PARALLEL_THRESHOLD, path=None, executor=None):
+    """Returns the bitset of worlds where each of the given formulas holds, in
+    the same order, like ks.extensions(formulas). Structures with fewer worlds
+    than the threshold are evaluated serially. Otherwise the worlds are
+    evaluated in shards by an executor (by default a new process pool of the
+    given number of workers, all cores if None), from the file ks is stored
+    in: the given path, else the file it was saved to or loaded from, else a
+    temporary file that is removed afterwards. Writing that file usually takes
+    longer than serial evaluation, so structures that are evaluated in parallel
+    should be saved once and reused.
+    """
+    formulas = list(formulas)
+    n = len(ks.worlds)
+    if n < threshold or not formulas:
+        return ks.extensions(formulas)
+    path = path or ks.stored_path
+    temporary = path is None or not os.path.exists(path)
+    if temporary:
+        descriptor, path = tempfile.mkstemp(suffix='.mlks')
+        os.close(descriptor)
+        storage.save(ks, path)
+    try:
+        own_executor = executor is None
+        if own_executor:
+            executor = _process_pool(workers)
+        try:
+            count = (workers or os.cpu_count() or 1) * _SHARDS_PER_WORKER
+            size = -(-n // count)
+            shards = [(start, min(start + size, n)) for start in range(0, n, size)]
+            futures = [executor.submit(_evaluate_shard, path, formulas, start, stop) for (start, stop) in shards]
+            results = [0] * len(formulas)
+            for future in futures:
+                for i, bits in enumerate(future.result()):
+                    results[i] |= bits
+            return results
+        except FileNotFoundError:
+            # The file was removed while the workers opened it, like an evicted cache entry
+            return ks.extensions(formulas)
+        finally:
+            if own_executor:
+                executor.shutdown()
+    finally:
+        if temporary:
+            os.remove(path)
+
+
+def _process_pool(workers):
+    # Forked workers do not import the main module again, so scripts without a
+    # __main__ guard can use this as well. Before Python 3.7 the start method
+    # can't be chosen per pool, but it is fork by default where it exists.
+    if sys.version_info >= (3, 7) and 'fork' in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'))
+    return ProcessPoolExecutor(workers)
+
+
+def nodes_not_follow_formulas(ks, formulas, **options):
+    """Returns, for each of the given formulas, the list of worlds where it
+    does not hold, evaluated as by extensions() with the same options.
+    """
+    everywhere = ks.all_worlds()
+    return [ks.names_of(everywhere & ~bits) for bits in extensions(ks, formulas, **options)]
+
+
+def _evaluate_shard(path, formulas, start, stop):
+    # Runs in a worker: the model is loaded once per process and kept, so that
+    # compiled subformulas are shared between the shards it evaluates. As in
+    # KripkeStructure.extensions(), every subformula is evaluated once over
+    # all worlds of the shard as a bitset: atoms from the rows of the shard,
+    # and connectives bitwise. Only modal subformulas, whose value depends on
+    # other worlds, are evaluated world by world on the whole model.
+    from mlsolver.formula import Atom, Not, And, Or, Implies, compile_formula, intern
+    key = (path, os.stat(path).st_mtime_ns)
+    ks = _loaded.get(key)
+    if ks is None:
+        ks = KripkeStructure.load(path, mmap=True)
+        _loaded.clear()
+        _loaded[key] = ks
+    index = ks.worlds.proposition_index(start, stop)
+    everywhere = (1 << (stop - start)) - 1
+    names = None
+    formulas = [intern(formula) for formula in formulas]
+    bits = {}
+    for formula in _postorder(formulas):
+        if isinstance(formula, Atom):
+            result = index.get(formula.name, 0)
+        elif isinstance(formula, Not):
+            result = everywhere & ~bits[id(formula.inner)]
+        elif isinstance(formula, And):
+            result = bits[id(formula.left)] & bits[id(formula.right)]
+        elif isinstance(formula, Or):
+            result = bits[id(formula.left)] | bits[id(formula.right)]
+        elif isinstance(formula, Implies):
+            result = (everywhere & ~bits[id(formula.left)]) | bits[id(formula.right)]
+        else:
+            if names is None:
+                names = ks.worlds.names[start:stop]
+            evaluate = compile_formula(formula, ks)
+            result = 0
+            for i, name in enumerate(names):
+                if evaluate(name):
+                    result |= 1 << i
+        bits[id(formula)] = result
+    return [bits[id(formula)] << start for formula in formulas]
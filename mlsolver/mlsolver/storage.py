@@ -0,0 +1,395 @@
+"""Storage module
+
+Saves Kripke structures in a compact binary file and loads them again,
+memory-mapping the arrays so that loading does not copy them and several
+processes can share the same pages.
+
+The file starts with a magic line and the length of a JSON header, which
+lists the propositional variables and, per relation, where its arrays are.
+Then follow, each 8-byte aligned, the world names (each JSON-encoded, one
+after the other, with 64 bit offsets), the assignment matrix (one
+little-endian row of bits per world, one bit per variable) and the arrays of
+each relation: CSR indptr (64 bit) and indices (32 bit) arrays over world
+ids, or for a partition one 32 bit class id per world and the world ids
+grouped by class (32 bit) with the offset of each class (64 bit). Names,
+worlds and classes are only decoded when a query looks them up.
+"""
+
+import json
+import mmap as mmap_module
+import sys
+
+from array import array
+from collections.abc import Mapping, Sequence
+
+from mlsolver.kripke import KripkeStructure, World, Partition, CSRRelation, Vocabulary, BitAssignment
+
+MAGIC = b'MLKS\x02\n'
+_ALIGNMENT = 8
+
+
+def save(ks, path):
+    """Writes a Kripke structure to a file. World names must be strings or
+    tuples of strings, and agents and variables strings. Assignments are
+    stored as their true variables only.
+    """
+    names = list(ks.world_ids())
+    ids = ks.world_ids()
+    # Bit assignments are kept as bits over their vocabulary, and only
+    # translated to the bits of the file once its variables are known
+    assignments = []
+    true_bits = {}
+    for name in names:
+        assignment = ks.worlds[name].assignment
+        if isinstance(assignment, BitAssignment):
+            vocabulary = assignment.vocabulary
+            true_bits[vocabulary] = true_bits.get(vocabulary, 0) | assignment.bits
+            assignments.append((vocabulary, assignment.bits))
+        else:
+            assignments.append((None, [p for p, value in assignment.items() if value]))
+    if len(true_bits) == 1 and all(vocabulary is not None for (vocabulary, _) in assignments):
+        # All worlds share one vocabulary, as in most models, so its bits are used as they are
+        propositions = list(list(true_bits)[0].propositions)
+    else:
+        propositions = set(p for (vocabulary, true) in assignments if vocabulary is None for p in true)
+        for vocabulary, bits in true_bits.items():
+            propositions.update(p for i, p in enumerate(vocabulary.propositions) if bits >> i & 1)
+        propositions = sorted(propositions)
+    bit_of = {p: i for i, p in enumerate(propositions)}
+    row_bytes = (len(propositions) + 7) // 8
+    translations = {}
+    for vocabulary in true_bits:
+        translation = [1 << bit_of[p] if p in bit_of else 0 for p in vocabulary.propositions]
+        identity = all(bit == 1 << i for i, bit in enumerate(translation) if bit)
+        translations[vocabulary] = None if identity else translation
+
+    chunks = []
+    offset = 0
+
+    def add(data):
+        nonlocal offset
+        padding = -offset % _ALIGNMENT
+        chunks.append(b'\0' * padding)
+        offset += padding
+        start = offset
+        chunks.append(data)
+        offset += len(data)
+        return start
+
+    encoded_names = bytearray()
+    name_offsets = array('q', [0])
+    for name in names:
+        encoded_names += json.dumps(name).encode()
+        name_offsets.append(len(encoded_names))
+    header = {'byteorder': sys.byteorder, 'count': len(names), 'propositions': propositions,
+              'name_offsets': add(name_offsets.tobytes()), 'names': add(bytes(encoded_names))}
+
+    matrix = bytearray()
+    for vocabulary, true in assignments:
+        if vocabulary is None:
+            bits = 0
+            for proposition in true:
+                bits |= 1 << bit_of[proposition]
+        elif translations[vocabulary] is None:
+            bits = true
+        else:
+            translation = translations[vocabulary]
+            bits = 0
+            while true:
+                low = true & -true
+                bits |= translation[low.bit_length() - 1]
+                true ^= low
+        matrix += bits.to_bytes(row_bytes, 'little')
+    header['row_bytes'] = row_bytes
+    header['matrix'] = add(bytes(matrix))
+    header['relations'] = []
+
+    unlabelled = not isinstance(ks.relations, dict)
+    relations = [(None, ks.relations)] if unlabelled else list(ks.relations.items())
+    for agent, relation in relations:
+        entry = {'agent': agent}
+        if isinstance(relation, Partition):
+            classes = array('i', [-1] * len(names))
+            grouped = []
+            for members in relation.members.values():
+                members = sorted(ids[name] for name in members if name in ids)
+                if members:
+                    for i in members:
+                        classes[i] = len(grouped)
+                    grouped.append(members)
+            order = array('i')
+            class_offsets = array('q', [0])
+            for members in grouped:
+                order.extend(members)
+                class_offsets.append(len(order))
+            entry['kind'] = 'partition'
+            entry['classes'] = add(classes.tobytes())
+            entry['class_count'] = len(grouped)
+            entry['order'] = add(order.tobytes())
+            entry['class_offsets'] = add(class_offsets.tobytes())
+        else:
+            if not (isinstance(relation, CSRRelation) and relation.names == names):
+                relation = CSRRelation.from_pairs(((w, v) for (w, v) in relation if w in ids and v in ids), names)
+            entry['kind'] = 'csr'
+            entry['indptr'] = add(array('q', relation.indptr).tobytes())
+            entry['indices'] = add(array('i', relation.indices).tobytes())
+            entry['pairs'] = len(relation.indices)
+        header['relations'].append(entry)
+    header['unlabelled'] = unlabelled
+
+    encoded = json.dumps(header).encode()
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, 'little'))
+        f.write(encoded)
+        base = len(MAGIC) + 8 + len(encoded)
+        f.write(b'\0' * (-base % _ALIGNMENT))
+        for chunk in chunks:
+            f.write(chunk)
+
+
+def load(path, mmap=True):
+    """Reads a Kripke structure written by save(). With mmap, the file is
+    memory-mapped and the arrays are used in place; names, worlds and classes
+    are only decoded when they are looked up.
+    """
+    with open(path, 'rb') as f:
+        if mmap:
+            data = memoryview(mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ))
+        else:
+            data = memoryview(f.read())
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        raise ValueError("Not a Kripke structure file: " + str(path))
+    length = int.from_bytes(data[len(MAGIC):len(MAGIC) + 8], 'little')
+    start = len(MAGIC) + 8
+    header = json.loads(bytes(data[start:start + length]))
+    base = start + length
+    base += -base % _ALIGNMENT
+    swap = header['byteorder'] != sys.byteorder
+
+    def view(offset, typecode, count):
+        size = array(typecode).itemsize
+        chunk = data[base + offset:base + offset + size * count]
+        if swap:
+            # Arrays of the other byte order are copied once
+            converted = array(typecode, bytes(chunk))
+            converted.byteswap()
+            return converted
+        return chunk.cast(typecode)
+
+    count = header['count']
+    name_offsets = view(header['name_offsets'], 'q', count + 1)
+    names = StoredNames(data[base + header['names']:base + header['names'] + name_offsets[count]], name_offsets)
+    matrix = base + header['matrix']
+    worlds = StoredWorlds(names, data[matrix:matrix + header['row_bytes'] * count], header['row_bytes'],
+                          Vocabulary(header['propositions']))
+    relations = {}
+    for entry in header['relations']:
+        if entry['kind'] == 'partition':
+            offsets = view(entry['class_offsets'], 'q', entry['class_count'] + 1)
+            relation = StoredPartition(worlds, view(entry['classes'], 'i', count),
+                                       view(entry['order'], 'i', offsets[entry['class_count']]), offsets)
+        else:
+            relation = CSRRelation(names, view(entry['indptr'], 'q', count + 1),
+                                   view(entry['indices'], 'i', entry['pairs']), worlds.ids)
+        relations[entry['agent']] = relation
+    if header['unlabelled']:
+        relations = set(relations[None])
+    return KripkeStructure(worlds, relations)
+
+
+class StoredNames(Sequence):
+    """
+    The world names of a loaded Kripke structure in world id order, decoded
+    when they are looked up.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        name = json.loads(bytes(self.data[self.offsets[i]:self.offsets[i + 1]]))
+        return tuple(name) if isinstance(name, list) else name
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __eq__(self, other):
+        return isinstance(other, Sequence) and len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+
+class StoredIds(Mapping):
+    """
+    The world ids of a loaded Kripke structure by name, indexed when a name is
+    first looked up.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self._index = None
+
+    def _ids(self):
+        if self._index is None:
+            self._index = {name: i for i, name in enumerate(self.names)}
+        return self._index
+
+    def __getitem__(self, name):
+        return self._ids()[name]
+
+    def __contains__(self, name):
+        return name in self._ids()
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class StoredWorlds(Mapping):
+    """
+    The worlds of a loaded Kripke structure by name, read from the assignment
+    matrix when they are looked up.
+    """
+
+    def __init__(self, names, matrix, row_bytes, vocabulary):
+        self.names = names
+        self.matrix = matrix
+        self.row_bytes = row_bytes
+        self.vocabulary = vocabulary
+        self.ids = StoredIds(names)
+        self.removed = set()
+
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        i = self.ids[name]
+        bits = int.from_bytes(self.matrix[i * self.row_bytes:(i + 1) * self.row_bytes], 'little')
+        return World(name, BitAssignment(bits, self.vocabulary))
+
+    def __contains__(self, name):
+        return name in self.ids and name not in self.removed
+
+    def __iter__(self):
+        for name in self.names:
+            if name not in self.removed:
+                yield name
+
+    def __len__(self):
+        return len(self.names) - len(self.removed)
+
+    def pop(self, name):
+        world = self[name]
+        self.removed.add(name)
+        return world
+
+    def proposition_index(self, start, stop):
+        # The bitset of the worlds with ids from start to stop (the lowest bit
+        # for start) where each variable is true, reading only their rows
+        index = {}
+        propositions = self.vocabulary.propositions
+        row_bytes = self.row_bytes
+        for i in range(start, stop):
+            bits = int.from_bytes(self.matrix[i * row_bytes:(i + 1) * row_bytes], 'little')
+            while bits:
+                low = bits & -bits
+                proposition = propositions[low.bit_length() - 1]
+                index[proposition] = index.get(proposition, 0) | 1 << (i - start)
+                bits ^= low
+        return index
+
+    def atom_test(self, proposition):
+        # Whether a variable is true in the world of an id, reading one byte of its row. None once worlds are
+        # removed, as the ids of the structure then no longer are rows.
+        if self.removed:
+            return None
+        bit = self.vocabulary.bit_of.get(proposition)
+        if bit is None:
+            return lambda i: False
+        matrix, row_bytes, byte, mask = self.matrix, self.row_bytes, bit // 8, 1 << bit % 8
+        return lambda i: matrix[i * row_bytes + byte] & mask != 0
+
+
+class StoredPartition(Partition):
+    """
+    A partition of a loaded Kripke structure, over its class id per world and
+    its world ids grouped by class. Classes are decoded when first needed.
+    """
+
+    def __init__(self, worlds, classes, order, offsets):
+        Partition.__init__(self, StoredClassOf(worlds, classes), StoredMembers(worlds, order, offsets))
+
+    def remove(self, world):
+        # The world is removed from the world mapping itself, which the classes are filtered by
+        class_id = self.class_of.classes[self.class_of.worlds.ids[world]]
+        if class_id >= 0:
+            self.members.discard(class_id, world)
+
+
+class StoredClassOf(Mapping):
+    """
+    The class id of each world of a StoredPartition that is in a class.
+    """
+
+    def __init__(self, worlds, classes):
+        self.worlds = worlds
+        self.classes = classes
+
+    def __getitem__(self, name):
+        if name not in self.worlds or self.classes[self.worlds.ids[name]] < 0:
+            raise KeyError(name)
+        return self.classes[self.worlds.ids[name]]
+
+    def __iter__(self):
+        for name in self.worlds:
+            if self.classes[self.worlds.ids[name]] >= 0:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class StoredMembers(Mapping):
+    """
+    The members of each class of a StoredPartition, decoded per class when
+    first needed. Classes without members left are missing.
+    """
+
+    def __init__(self, worlds, order, offsets):
+        self.worlds = worlds
+        self.order = order
+        self.offsets = offsets
+        self.decoded = {}
+
+    def __getitem__(self, class_id):
+        members = self.decoded.get(class_id)
+        if members is None:
+            if not (isinstance(class_id, int) and 0 <= class_id < len(self.offsets) - 1):
+                raise KeyError(class_id)
+            names = self.worlds.names
+            members = [names[i] for i in self.order[self.offsets[class_id]:self.offsets[class_id + 1]]]
+            members = [name for name in members if name not in self.worlds.removed]
+            self.decoded[class_id] = members
+        if not members:
+            raise KeyError(class_id)
+        return members
+
+    def __iter__(self):
+        for class_id in range(len(self.offsets) - 1):
+            if class_id in self:
+                yield class_id
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def discard(self, class_id, name):
+        members = self.decoded.get(class_id)
+        if members is not None and name in members:
+            members.remove(name)
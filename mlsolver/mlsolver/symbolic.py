@@ -0,0 +1,240 @@
+"""Symbolic Kripke module
+
+Provides a Kripke structure whose worlds and relations are encoded as binary
+decision diagrams over propositional variables, so that models too large to
+enumerate can still be checked. A world is identified by its assignment.
+"""
+
+from mlsolver.bdd import BDD
+from mlsolver.kripke import Partition
+
+
+class SymbolicKripkeStructure:
+    """
+    This class describes a Kripke structure by BDDs. Every proposition has a
+    current and a next variable: the set of worlds is a BDD over the current
+    variables, and each agent's relation a BDD over both, or a list of BDDs
+    whose conjunction is the relation. Such a partitioned relation is much
+    cheaper to quantify over, part by part. Formulas are evaluated with
+    extension(), which returns the set of worlds where they hold as a BDD
+    Function.
+    """
+
+    def __init__(self, propositions, bdd=None):
+        self.bdd = BDD() if bdd is None else bdd
+        self.levels = {}
+        for proposition in propositions:
+            self.add_proposition(proposition)
+        self.worlds = self.bdd.function(1)
+        self.relations = {}
+        self.updates = 0
+        self._extensions = {}
+
+    @classmethod
+    def from_kripke(cls, ks):
+        """Returns the symbolic form of an explicit Kripke structure, whose
+        worlds must have pairwise different assignments.
+        """
+        propositions = sorted(set(p for w in ks.worlds.values() for p, value in w.assignment.items() if value))
+        symbolic = cls(propositions)
+        valuation = {}
+        for name, world in ks.worlds.items():
+            valuation[name] = symbolic.valuation({p for p, value in world.assignment.items() if value})
+        if len(set(v.node for v in valuation.values())) != len(valuation):
+            raise ValueError("Worlds with the same assignment cannot be told apart symbolically")
+        symbolic.worlds = symbolic.bdd.function(0)
+        for v in valuation.values():
+            symbolic.worlds = symbolic.worlds | v
+        for agent in ks.agents():
+            relation = symbolic.bdd.function(0)
+            for (start_node, end_node) in ks.get_relation(agent):
+                if start_node in valuation and end_node in valuation:
+                    relation = relation | (valuation[start_node] & symbolic.to_next(valuation[end_node]))
+            symbolic.relations[agent] = relation
+        return symbolic
+
+    def add_proposition(self, proposition):
+        """Adds a propositional variable, with its current and next variable
+        ordered after all existing ones.
+        """
+        if proposition not in self.levels:
+            self.levels[proposition] = (2 * len(self.levels), 2 * len(self.levels) + 1)
+
+    def var(self, proposition, next=False):
+        """Returns the Function of the current (or next) variable of a
+        proposition.
+        """
+        return self.bdd.function(self.bdd.var(self.levels[proposition][1 if next else 0]))
+
+    def valuation(self, true_propositions):
+        """Returns the Function that holds only for the assignment making
+        exactly the given propositions true.
+        """
+        true_propositions = set(true_propositions)
+        node = 1
+        for proposition, (level, _) in sorted(self.levels.items(), key=lambda item: -item[1][0]):
+            literal = self.bdd.var(level)
+            if proposition not in true_propositions:
+                literal = self.bdd.neg(literal)
+            node = self.bdd.conj(literal, node)
+        return self.bdd.function(node)
+
+    def exactly(self, propositions, k):
+        """Returns the Function that holds iff exactly k of the propositions
+        are true.
+        """
+        return self.bdd.function(self.bdd.exactly([self.levels[p][0] for p in propositions], k))
+
+    def same(self, propositions):
+        """Returns the relation (over current and next variables) between
+        worlds that agree on the given propositions.
+        """
+        node = 1
+        for proposition in propositions:
+            current, next_level = self.levels[proposition]
+            node = self.bdd.conj(node, self.bdd.equiv(self.bdd.var(current), self.bdd.var(next_level)))
+        return self.bdd.function(node)
+
+    def to_next(self, bits):
+        """Returns a Function over current variables renamed to next ones.
+        """
+        mapping = {current: next_level for (current, next_level) in self.levels.values()}
+        return self.bdd.function(self.bdd.rename(bits.node, mapping))
+
+    def _current_levels(self):
+        return [current for (current, _) in self.levels.values()]
+
+    def count(self, bits=None):
+        """Returns the number of worlds in a set of worlds (all by default).
+        """
+        bits = self.worlds if bits is None else bits
+        return self.bdd.count(bits.node, self._current_levels())
+
+    def assignments(self, bits=None):
+        """Yields the set of true propositions of every world in a set of
+        worlds (all by default).
+        """
+        bits = self.worlds if bits is None else bits
+        proposition_of = {current: p for p, (current, _) in self.levels.items()}
+        for true_levels in self.bdd.assignments(bits.node, self._current_levels()):
+            yield frozenset(proposition_of[level] for level in true_levels)
+
+    def agents(self):
+        return list(self.relations)
+
+    def all_worlds(self):
+        return self.worlds
+
+    def atom_extension(self, proposition):
+        if proposition not in self.levels:
+            return self.bdd.function(0)
+        return self.worlds & self.var(proposition)
+
+    def extension(self, formula):
+        """Returns the set of worlds where a formula holds, as a Function.
+        Results are memoized per (sub)formula.
+        """
+        result = self._extensions.get(formula)
+        if result is None:
+            result = formula.extension(self)
+            self._extensions[formula] = result
+        return result
+
+    def valid(self, formula):
+        """Returns whether a formula holds in every world.
+        """
+        return self.extension(formula) == self.worlds
+
+    def preimage(self, agent, bits):
+        """Returns the set of worlds with at least one successor in bits under
+        an agent's relation.
+        """
+        relation = self.relations.get(agent)
+        if relation is None:
+            return self.bdd.function(0)
+        parts = relation if isinstance(relation, list) else [relation]
+        next_of = {current: next_level for (current, next_level) in self.levels.values()}
+        next_levels = set(next_of.values())
+        supports = [self.bdd.support(part.node) & next_levels for part in parts]
+        constrained = set().union(*supports)
+        # Successors are free in every variable no part of the relation constrains
+        free = [current for current, next_level in next_of.items() if next_level not in constrained]
+        node = self.bdd.rename(self.bdd.exists(free, bits.node), next_of)
+        for i, part in enumerate(parts):
+            # Quantify each next variable as soon as no later part mentions it
+            node = self.bdd.and_exists(node, part.node, supports[i].difference(*supports[i + 1:]))
+        return self.worlds & self.bdd.function(node)
+
+    def group_extension(self, agents, bits, reflexive=False):
+        """Returns the set of worlds from which only worlds in bits are
+        reachable in one or more steps (zero or more if reflexive) of the
+        union of the agents' relations, as a greatest fixpoint.
+        """
+        everywhere = self.worlds
+        result = everywhere
+        while True:
+            target = bits & result
+            step = everywhere
+            for agent in agents:
+                step = step & ~self.preimage(agent, everywhere & ~target)
+            if step == result:
+                break
+            result = step
+        return bits & result if reflexive else result
+
+    def product_update(self, action_model):
+        """Returns the product of this structure with an action model, whose
+        actions have a name and a precondition and whose equivs give each
+        agent's indistinguishable pairs of action names. Actions are encoded
+        by new propositions, so worlds stay identified by their assignment.
+        """
+        actions = action_model.actions
+        width = max(1, (len(actions) - 1).bit_length())
+        code_propositions = ["@" + str(self.updates) + "." + str(i) for i in range(width)]
+
+        updated = SymbolicKripkeStructure([], self.bdd)
+        updated.levels = dict(self.levels)
+        for proposition in code_propositions:
+            updated.add_proposition(proposition)
+        updated.updates = self.updates + 1
+
+        def code(index, next=False):
+            return updated.valuation_of(code_propositions, {p for i, p in enumerate(code_propositions)
+                                                             if index >> i & 1}, next)
+
+        updated.worlds = self.bdd.function(0)
+        for index, action in enumerate(actions):
+            updated.worlds = updated.worlds | (code(index) & self.extension(action.precon))
+
+        names = [a.name for a in actions]
+        index_of = {name: index for index, name in enumerate(names)}
+        for agent, relation in self.relations.items():
+            partition = action_model.equivs[agent]
+            if not isinstance(partition, Partition):
+                partition = Partition.from_pairs(partition, names)
+            equivalence = self.bdd.function(0)
+            if partition is not None:
+                for members in partition.members.values():
+                    current = self.bdd.function(0)
+                    for name in members:
+                        current = current | code(index_of[name])
+                    following = self.bdd.function(0)
+                    for name in members:
+                        following = following | code(index_of[name], True)
+                    equivalence = equivalence | (current & following)
+            else:
+                for (a, b) in action_model.equivs[agent]:
+                    equivalence = equivalence | (code(index_of[a]) & code(index_of[b], True))
+            parts = relation if isinstance(relation, list) else [relation]
+            updated.relations[agent] = parts + [equivalence]
+        return updated
+
+    def valuation_of(self, propositions, true_propositions, next=False):
+        """Returns the Function that holds iff, out of the given propositions,
+        exactly the true ones are true (on the next variables if next).
+        """
+        result = self.bdd.function(1)
+        for proposition in propositions:
+            literal = self.var(proposition, next)
+            result = result & (literal if proposition in true_propositions else ~literal)
+        return result
@@ -0,0 +1,41 @@
+from mlsolver.formula import Atom, And, Not
+from mlsolver.kripke import KripkeStructure, World, Vocabulary, BitAssignment
+
+
+def test_vocabulary_intern():
+    vocabulary = Vocabulary(['p', 'q'])
+    assert vocabulary.intern('q') == 1
+    assert vocabulary.intern('r') == 2
+    assert vocabulary.propositions == ['p', 'q', 'r']
+
+
+def test_bit_assignment_reads_like_dict():
+    vocabulary = Vocabulary(['p', 'q', 'r'])
+    assignment = vocabulary.assignment(['p', 'r'])
+    assert assignment.bits == 0b101
+    assert assignment.get('p', False) is True
+    assert assignment.get('q', False) is False
+    assert assignment.get('s', False) is False
+    assert assignment['r'] is True
+    assert sorted(assignment) == ['p', 'r']
+    assert len(assignment) == 2
+    assert assignment == {'p': True, 'r': True}
+    assert {'p': True, 'r': True} == assignment
+    assert assignment == vocabulary.assignment(['r', 'p'])
+    assert assignment != BitAssignment(0b1, vocabulary)
+
+
+def test_world_slots():
+    world = World('1', {'p': True})
+    assert not hasattr(world, '__dict__')
+
+
+def test_bit_assignment_semantic():
+    vocabulary = Vocabulary()
+    ks = KripkeStructure([World('1', vocabulary.assignment(['p', 'q'])), World('2', vocabulary.assignment(['p']))],
+                         {})
+    formula = And(Atom('p'), Not(Atom('q')))
+    assert not formula.semantic(ks, '1')
+    assert formula.semantic(ks, '2')
+    assert ks.nodes_not_follow_formula(formula) == ['1']
+    assert ks.worlds['2'] == World('2', {'p': True})
@@ -0,0 +1,43 @@
+from mlsolver.formula import Atom, And, Not, Box_a, Diamond_a, Common
+from mlsolver.kripke import _postorder
+from mlsolver.model import WiseMenWithHat
+
+
+def test_extensions_match_single():
+    ks = WiseMenWithHat().ks
+    formulas = [Box_a(agent, Atom(str(man) + ':' + colour)) for agent in ['1', '2', '3'] for man in [1, 2, 3]
+                for colour in 'RW']
+    formulas += [Not(Box_a('1', Atom('1:R'))), And(Diamond_a('2', Atom('1:W')), Common(['1', '2'], Atom('3:R')))]
+    expected = [WiseMenWithHat().ks.extension(formula) for formula in formulas]
+    assert ks.extensions(formulas) == expected
+    assert ks.nodes_not_follow_formulas(formulas) == [ks.nodes_not_follow_formula(f) for f in formulas]
+
+
+def test_extensions_evaluate_shared_subformulas_once():
+    calls = []
+
+    class Counted(Atom):
+        def extension(self, ks):
+            calls.append(self.name)
+            return Atom.extension(self, ks)
+
+    ks = WiseMenWithHat().ks
+    p = Counted('1:R')
+    ks.extensions([Box_a('1', p), Box_a('2', Counted('1:R')), Not(Box_a('1', Counted('1:R')))])
+    assert calls == ['1:R']
+
+
+def test_postorder_deep_formula():
+    formula = Atom('p')
+    for _ in range(5000):
+        formula = Not(formula)
+    order = _postorder([formula])
+    assert len(order) == 5001 and order[0] == Atom('p') and order[-1] is formula
+
+
+def test_extensions_deep_formula():
+    ks = WiseMenWithHat().ks
+    formula = Atom('1:R')
+    for _ in range(5000):
+        formula = Not(formula)
+    assert ks.extensions([formula, Not(formula)]) == [ks.extension(Atom('1:R')), ks.extension(Not(Atom('1:R')))]
@@ -0,0 +1,63 @@
+from mlsolver.formula import Atom, And, Not, Box_a, Diamond_a
+from mlsolver.kripke import KripkeStructure, World, Partition
+from mlsolver.model import WiseMenWithHat
+
+
+def test_contraction_merges_copies():
+    worlds = [World('1', {'p': True}), World('2', {'p': True}), World('3', {'q': True}), World('4', {'q': True})]
+    relations = {'a': {('1', '3'), ('2', '4'), ('3', '3'), ('4', '4')}}
+    ks = KripkeStructure(worlds, relations)
+    contracted = ks.bisimulation_contraction()
+    assert sorted(contracted.worlds) == ['1', '3']
+    assert contracted.relations == {'a': {('1', '3'), ('3', '3')}}
+
+
+def test_contraction_keeps_distinguishable_worlds():
+    worlds = [World('1', {'p': True}), World('2', {'p': True}), World('3', {'q': True})]
+    relations = {('1', '3'), ('3', '3')}
+    ks = KripkeStructure(worlds, relations)
+    contracted = ks.bisimulation_contraction()
+    assert sorted(contracted.worlds) == ['1', '2', '3']
+    assert contracted.relations == relations
+
+
+def test_contraction_chain():
+    # 1 -> 2 -> 3 and 4 -> 5 with equal assignments: 1 and 4 differ in depth
+    worlds = [World(str(i), {'p': True}) for i in range(1, 6)]
+    relations = {('1', '2'), ('2', '3'), ('4', '5')}
+    contracted = KripkeStructure(worlds, relations).bisimulation_contraction()
+    assert sorted(contracted.worlds) == ['1', '2', '3']
+    assert contracted.relations == {('1', '2'), ('2', '3')}
+
+
+def test_contraction_wise_men_is_minimal():
+    ks = WiseMenWithHat().ks
+    assert ks.bisimulation_contraction() == ks
+
+
+def test_contraction_partition():
+    worlds = [World('1', {'p': True}), World('2', {'q': True}), World('3', {'p': True}), World('4', {'q': True}),
+              World('5', {'p': True})]
+    relations = {'a': Partition({'1': 0, '2': 0, '3': 1, '4': 1, '5': 2}),
+                 'b': Partition({'1': 0, '2': 1, '3': 2, '4': 3, '5': 4})}
+    ks = KripkeStructure(worlds, relations)
+    contracted = ks.bisimulation_contraction()
+    assert sorted(contracted.worlds) == ['1', '2', '5']
+    assert isinstance(contracted.relations['a'], Partition)
+    assert contracted.relations['a'] == {('1', '1'), ('1', '2'), ('2', '1'), ('2', '2'), ('5', '5')}
+    for formula in [Diamond_a('a', Atom('q')), Box_a('a', Atom('p')), Diamond_a('b', Atom('q')),
+                    And(Atom('p'), Not(Diamond_a('a', Atom('q'))))]:
+        for name in ks.worlds:
+            representative = {'1': '1', '2': '2', '3': '1', '4': '2', '5': '5'}[name]
+            assert formula.semantic(ks, name) == formula.semantic(contracted, representative)
+
+
+def test_contraction_needs_three_way_split():
+    # 1 and 2 see p and q worlds, 3 only p worlds and 4 only q worlds: the
+    # blocks seeing the p worlds must also be split by seeing the q worlds
+    worlds = [World('1', {}), World('2', {}), World('3', {}), World('4', {}),
+              World('5', {'p': True}), World('6', {'q': True})]
+    relations = {'a': {('1', '5'), ('1', '6'), ('2', '5'), ('2', '6'), ('3', '5'), ('4', '6')},
+                 'b': Partition({'1': None, '2': None, '3': 0, '5': None})}
+    contracted = KripkeStructure(worlds, relations).bisimulation_contraction()
+    assert sorted(contracted.worlds) == ['1', '3', '4', '5', '6']
@@ -0,0 +1,76 @@
+from mlsolver.formula import Atom, Or, Not, Box_star, Common, Everybody
+from mlsolver.kripke import KripkeStructure, World, Partition
+from mlsolver.model import WiseMenWithHat
+
+
+def chain():
+    # 1 -a-> 2 -b-> 3, where p is false only in 3
+    worlds = [World('1', {'p': True}), World('2', {'p': True}), World('3', {'p': False})]
+    return KripkeStructure(worlds, {'a': {('1', '2')}, 'b': {('2', '3')}})
+
+
+def assert_extension_matches_semantic(ks, formula):
+    expected = [name for name in ks.worlds if formula.semantic(ks, name)]
+    assert ks.names_of(ks.extension(formula)) == expected
+
+
+def test_box_star_beyond_depth_one():
+    ks = chain()
+    assert not Box_star(Atom('p')).semantic(ks, '1')
+    assert not Box_star(Atom('p')).semantic(ks, '2')
+    assert ks.nodes_not_follow_formula(Box_star(Atom('p'))) == ['1', '2', '3']
+
+
+def test_common_one_or_more_steps():
+    ks = chain()
+    assert not Common(['a', 'b'], Atom('p')).semantic(ks, '1')
+    assert Common(['a'], Atom('p')).semantic(ks, '1')
+    # Without a reflexive edge, 3 reaches nothing
+    assert Common(['a', 'b'], Atom('p')).semantic(ks, '3')
+    assert not Common(['b'], Atom('p')).semantic(ks, '2')
+    for formula in [Common(['a', 'b'], Atom('p')), Common(['a'], Atom('p')), Box_star(Atom('p')),
+                    Common(['b'], Not(Atom('p')))]:
+        assert_extension_matches_semantic(ks, formula)
+
+
+def test_common_cycle():
+    worlds = [World('1', {'p': True}), World('2', {'p': True}), World('3', {'p': False})]
+    ks = KripkeStructure(worlds, {'a': {('1', '2'), ('2', '1'), ('3', '1')}})
+    assert Common(['a'], Atom('p')).semantic(ks, '1')
+    assert Common(['a'], Atom('p')).semantic(ks, '3')
+    assert not Box_star(Atom('p')).semantic(ks, '3')
+    assert ks.names_of(ks.reachable(['a'], '3')) == ['1', '2']
+    assert ks.names_of(ks.reachable(['a'], '3', reflexive=True)) == ['1', '2', '3']
+
+
+def test_everybody():
+    ks = chain()
+    assert Everybody(['a', 'b'], Atom('p')).semantic(ks, '1')
+    assert not Everybody(['a', 'b'], Atom('p')).semantic(ks, '2')
+    assert_extension_matches_semantic(ks, Everybody(['a', 'b'], Atom('p')))
+
+
+def test_common_partition_components_cached():
+    worlds = [World(str(i), {'p': i != 4}) for i in range(1, 6)]
+    relations = {'a': Partition({'1': 0, '2': 0, '3': 1, '4': 1, '5': 2}),
+                 'b': Partition({'1': 0, '2': 1, '3': 1, '4': 2})}
+    ks = KripkeStructure(worlds, relations)
+    formula = Common(['a', 'b'], Atom('p'))
+    assert ks.nodes_not_follow_formula(formula) == ['1', '2', '3', '4']
+    assert Common(['a'], Atom('p')).semantic(ks, '1')
+    assert frozenset(['a', 'b']) in ks._groups
+    assert_extension_matches_semantic(ks, formula)
+    assert_extension_matches_semantic(ks, Common(['b'], Atom('p')))
+
+
+def test_common_knowledge_wise_men():
+    ks = WiseMenWithHat().ks
+    assert ks.nodes_not_follow_formula(Common(['1', '2', '3'], Or(Atom('1:R'), Atom('1:W')))) == []
+    assert len(ks.nodes_not_follow_formula(Common(['1', '2', '3'], Or(Atom('2:R'), Atom('3:R'))))) == 8
+
+
+def test_common_str_eq():
+    assert Common(['b', 'a'], Atom('p')) == Common(['a', 'b'], Atom('p'))
+    assert Common(['a'], Atom('p')) != Everybody(['a'], Atom('p'))
+    assert str(Common(['b', 'a'], Atom('p'))) == "C[a,b]p"
+    assert str(Everybody(['a'], Atom('p'))) == "E[a]p"
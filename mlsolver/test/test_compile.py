@@ -0,0 +1,35 @@
+from mlsolver.formula import Atom, And, Or, Not, Implies, Box, Diamond, Box_a, Diamond_a, Box_star, Common, \
+    Everybody, compile_formula
+from mlsolver.kripke import KripkeStructure, World, Partition
+from mlsolver.model import WiseMenWithHat
+
+
+def test_compiled_matches_semantic_wise_men():
+    ks = WiseMenWithHat().ks
+    for formula in [Atom('1:R'), Box_a('1', Atom('1:R')), Diamond_a('2', Atom('1:W')),
+                    And(Not(Box_a('1', Atom('1:R'))), Not(Box_a('1', Not(Atom('1:R'))))),
+                    Implies(Atom('2:R'), Box_a('3', Or(Atom('1:R'), Atom('2:R')))),
+                    Box_star(Or(Atom('2:R'), Atom('3:R'))), Common(['1', '2'], Atom('3:R')),
+                    Everybody(['1', '2'], Or(Atom('1:R'), Atom('1:W'))), Box_a('4', Atom('1:R'))]:
+        compiled = compile_formula(formula, ks)
+        assert [compiled(w) for w in ks.worlds] == [formula.semantic(ks, w) for w in ks.worlds]
+
+
+def test_compiled_unlabelled_and_partition():
+    worlds = [World('1', {'p': True}), World('2', {'p': False}), World('3', {'p': True}), World('4', {})]
+    ks = KripkeStructure(worlds, {('1', '2'), ('2', '3'), ('3', '3')})
+    for formula in [Box(Atom('p')), Diamond(Not(Atom('p'))), Box(Box(Atom('p')))]:
+        compiled = compile_formula(formula, ks)
+        assert [compiled(w) for w in ks.worlds] == [formula.semantic(ks, w) for w in ks.worlds]
+    ks = KripkeStructure(worlds, {'a': Partition({'1': 0, '2': 0, '3': 1, '4': 1})})
+    for formula in [Box_a('a', Atom('p')), Diamond_a('a', Not(Atom('p')))]:
+        compiled = compile_formula(formula, ks)
+        assert [compiled(w) for w in ks.worlds] == [formula.semantic(ks, w) for w in ks.worlds]
+
+
+def test_compiled_cache_dropped_on_change():
+    worlds = [World('1', {'p': True}), World('2', {'p': False})]
+    ks = KripkeStructure(worlds, {'a': {('1', '1'), ('1', '2')}})
+    assert not compile_formula(Box_a('a', Atom('p')), ks)('1')
+    ks.remove_node_by_name('2')
+    assert compile_formula(Box_a('a', Atom('p')), ks)('1')
@@ -0,0 +1,41 @@
+from mlsolver.formula import Atom, Not, Box_a, Diamond_a, Common
+from mlsolver.kripke import KripkeStructure, World, CSRRelation
+
+
+PAIRS = {('1', '2'), ('2', '2'), ('3', '1'), ('1', '3')}
+
+
+def structure():
+    worlds = [World('1', {'p': True}), World('2', {'p': False}), World('3', {'p': True})]
+    return KripkeStructure(worlds, {'a': set(PAIRS), 'b': {('2', '3'), ('3', '3')}})
+
+
+def test_csr_relation():
+    relation = CSRRelation.from_pairs(PAIRS, ['1', '2', '3'])
+    assert list(relation.indptr) == [0, 2, 3, 4]
+    assert list(relation.indices) == [1, 2, 1, 0]
+    assert set(relation) == PAIRS and len(relation) == 4
+    assert ('1', '3') in relation and ('3', '3') not in relation and ('4', '1') not in relation
+    assert relation.get('1') == ['2', '3'] and relation.get('4') == ()
+    assert relation == PAIRS
+
+
+def test_csr_remove_and_restrict():
+    relation = CSRRelation.from_pairs(PAIRS, ['1', '2', '3'])
+    assert set(relation.restrict(['1', '3'])) == {('1', '3'), ('3', '1')}
+    relation.remove('2')
+    assert relation.names == ['1', '3'] and set(relation) == {('1', '3'), ('3', '1')}
+
+
+def test_csr_structure_matches_sets():
+    ks = structure()
+    csr = ks.to_csr()
+    assert isinstance(csr.relations['a'], CSRRelation)
+    assert csr == ks and csr.fingerprint() == ks.fingerprint()
+    for formula in [Box_a('a', Atom('p')), Diamond_a('b', Not(Atom('p'))), Common(['a', 'b'], Atom('p'))]:
+        assert csr.extension(formula) == ks.extension(formula)
+        assert [formula.semantic(csr, w) for w in csr.worlds] == [formula.semantic(ks, w) for w in ks.worlds]
+    csr.remove_node_by_name('1')
+    ks.remove_node_by_name('1')
+    assert csr == ks
+    assert csr.extension(Box_a('b', Atom('p'))) == ks.extension(Box_a('b', Atom('p')))
@@ -0,0 +1,56 @@
+from mlsolver.formula import Atom, And, Or, Not, Implies, Box, Diamond, Box_a, Diamond_a, Box_star
+from mlsolver.kripke import KripkeStructure, World, Partition
+from mlsolver.model import WiseMenWithHat
+
+
+def assert_extension_matches_semantic(ks, formula):
+    expected = [name for name in ks.worlds if formula.semantic(ks, name)]
+    assert ks.names_of(ks.extension(formula)) == expected
+
+
+def test_extension_atom():
+    ks = KripkeStructure([World('1', {'p': True}), World('2', {'p': False}), World('3', {'p': True})], {})
+    assert ks.extension(Atom('p')) == 0b101
+    assert ks.names_of(ks.extension(Atom('p'))) == ['1', '3']
+    assert ks.extension(Atom('q')) == 0
+
+
+def test_extension_box_diamond():
+    worlds = [World('1', {'p': True, 'q': True}), World('2', {'p': True}), World('3', {'q': True})]
+    ks = KripkeStructure(worlds, {('1', '2'), ('2', '1'), ('1', '3'), ('3', '3')})
+    for formula in [Box(Atom('p')), Diamond(Atom('p')), Box(Box(Atom('q'))), Diamond(Not(Atom('q'))),
+                    Implies(Diamond(Atom('p')), And(Box(Box(Atom('q'))), Diamond(Atom('q'))))]:
+        assert_extension_matches_semantic(ks, formula)
+
+
+def test_extension_wise_men():
+    ks = WiseMenWithHat().ks
+    for formula in [Box_a('1', Atom('1:R')), Diamond_a('2', Atom('1:W')),
+                    And(Not(Box_a('1', Atom('1:R'))), Not(Box_a('1', Not(Atom('1:R'))))),
+                    Box_star(Or(Atom('2:R'), Atom('3:R'))), Box_a('4', Atom('1:R'))]:
+        assert_extension_matches_semantic(ks, formula)
+
+
+def test_extension_partition():
+    worlds = [World('1', {'p': True}), World('2', {'p': True}), World('3', {'p': False}), World('4', {})]
+    ks = KripkeStructure(worlds, {'a': Partition({'1': 0, '2': 0, '3': 1})})
+    for formula in [Box_a('a', Atom('p')), Diamond_a('a', Atom('p')), Box_a('a', Not(Atom('p')))]:
+        assert_extension_matches_semantic(ks, formula)
+
+
+def test_extension_after_remove_node():
+    worlds = [World('1', {'p': True}), World('2', {'p': False}), World('3', {'p': True})]
+    ks = KripkeStructure(worlds, {'a': {('1', '2'), ('1', '3'), ('3', '3')}})
+    assert ks.names_of(ks.extension(Box_a('a', Atom('p')))) == ['2', '3']
+    ks.remove_node_by_name('2')
+    assert ks.names_of(ks.extension(Box_a('a', Atom('p')))) == ['1', '3']
+
+
+def test_proposition_index():
+    worlds = [World('1', {'p': True, 'q': True}), World('2', {'p': True, 'q': False}), World('3', {'q': True})]
+    ks = KripkeStructure(worlds, {})
+    assert ks.proposition_index() == {'p': 0b011, 'q': 0b101}
+    assert ks.names_of(ks.extension(And(Atom('p'), Atom('q')))) == ['1']
+    ks.remove_node_by_name('1')
+    assert ks.proposition_index() == {'p': 0b01, 'q': 0b10}
+    assert ks.extension(And(Atom('p'), Atom('q'))) == 0
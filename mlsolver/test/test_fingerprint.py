@@ -0,0 +1,61 @@
+from mlsolver.kripke import KripkeStructure, World, Partition
+from mlsolver.model import WiseMenWithHat
+
+
+def structure(order=1):
+    worlds = [World('1', {'p': True}), World('2', {'q': True}), World('3', {'p': True, 'q': True})][::order]
+    relations = {'a': {('1', '2'), ('2', '2'), ('3', '1')}, 'b': {('1', '1'), ('1', '3'), ('3', '1'), ('3', '3'),
+                                                                 ('2', '2')}}
+    return KripkeStructure(worlds, relations)
+
+
+def test_fingerprint_independent_of_order_and_storage():
+    ks = structure()
+    assert ks.fingerprint() == structure(-1).fingerprint()
+    assert ks == structure(-1)
+    partitioned = structure()
+    partitioned.relations['b'] = Partition({'1': 0, '3': 0, '2': 1})
+    assert partitioned.fingerprint() == ks.fingerprint()
+    assert partitioned == ks and ks == partitioned
+
+
+def test_fingerprint_distinguishes():
+    ks = structure()
+    other = structure()
+    other.relations['a'] = {('1', '2'), ('2', '2'), ('3', '2')}
+    assert other.fingerprint() != ks.fingerprint()
+    assert other != ks
+    assert len({ks, structure(-1), other}) == 2
+
+
+def test_fingerprint_updated_on_remove():
+    for name in ['1', '2', '3']:
+        for relation_b in [None, Partition({'1': 0, '3': 0, '2': 1})]:
+            ks = structure()
+            if relation_b is not None:
+                ks.relations['b'] = relation_b
+            ks.fingerprint()
+            ks.remove_node_by_name(name)
+            assert ks.fingerprint() == ks.restrict(ks.worlds)._compute_fingerprint()
+    ks = WiseMenWithHat().ks
+    ks.fingerprint()
+    for name in list(ks.worlds)[:4]:
+        ks.remove_node_by_name(name)
+    assert ks.fingerprint() == ks.restrict(ks.worlds)._compute_fingerprint()
+
+
+def test_fingerprint_up_to_renaming():
+    ks = structure()
+    renamed = KripkeStructure([World(name + "'", w.assignment) for name, w in ks.worlds.items()],
+                              {a: {(w + "'", v + "'") for (w, v) in r} for a, r in ks.relations.items()})
+    assert renamed.fingerprint() != ks.fingerprint()
+    assert renamed.fingerprint(up_to_renaming=True) == ks.fingerprint(up_to_renaming=True)
+    other = structure()
+    other.relations['a'] = {('1', '2'), ('2', '2'), ('3', '2')}
+    assert other.fingerprint(up_to_renaming=True) != ks.fingerprint(up_to_renaming=True)
+
+
+def test_submodel_fingerprint():
+    ks = structure()
+    assert ks.submodel(0b101) == ks.restrict(['1', '3'])
+    assert ks.submodel(0b101).fingerprint() == ks.restrict(['1', '3']).fingerprint()
@@ -0,0 +1,57 @@
+from mlsolver.formula import Atom, And, Or, Not, Implies, Box, Box_a, Diamond_a, Box_star, intern
+from mlsolver.kripke import KripkeStructure, World
+
+
+def test_equal_formulas_hash_equal():
+    f = And(Box_a('a', Atom('p')), Not(Atom('q')))
+    g = And(Box_a('a', Atom('p')), Not(Atom('q')))
+    assert f == g
+    assert hash(f) == hash(g)
+    assert {f: 1}[g] == 1
+
+
+def test_different_types_not_equal():
+    assert And(Atom('p'), Atom('q')) != Or(Atom('p'), Atom('q'))
+    assert Not(Atom('p')) != Box(Atom('p'))
+    assert Box_a('a', Atom('p')) != Box_a('b', Atom('p'))
+    assert Box_a('a', Atom('p')) != Diamond_a('a', Atom('p'))
+
+
+def test_intern_same_object():
+    f = intern(Implies(Atom('p'), Box_a('a', Atom('q'))))
+    g = intern(Implies(Atom('p'), Box_a('a', Atom('q'))))
+    assert f is g
+    assert intern(f) is f
+
+
+def test_intern_shares_subformulas():
+    f = intern(And(Box_a('a', Atom('p')), Atom('q')))
+    g = intern(Or(Atom('r'), Box_a('a', Atom('p'))))
+    assert f.left is g.right
+    assert f.left.inner is intern(Atom('p'))
+
+
+def test_box_star_eq_and_str():
+    assert Box_star(Atom('p')) == Box_star(Atom('p'))
+    assert hash(Box_star(Atom('p'))) == hash(Box_star(Atom('p')))
+    assert str(Box_star(Atom('p'))) == u"☐*p"
+
+
+def test_evaluate_memoized_until_change():
+    worlds = [World('1', {'p': True}), World('2', {'p': False})]
+    ks = KripkeStructure(worlds, {'a': {('1', '1'), ('1', '2')}})
+    formula = Box_a('a', Atom('p'))
+    assert ks.evaluate(formula, '1') is False
+    assert ks.evaluate(Box_a('a', Atom('p')), '1') is False
+    assert len(ks._memo) == 1
+    ks.remove_node_by_name('2')
+    assert ks.evaluate(formula, '1') is True
+
+
+def test_extension_memoized_until_change():
+    worlds = [World('1', {'p': True}), World('2', {'p': False})]
+    ks = KripkeStructure(worlds, {'a': {('1', '1'), ('1', '2')}})
+    assert ks.extension(Box_a('a', Atom('p'))) == 0b10
+    assert Atom('p') in ks._extensions
+    ks.remove_node_by_name('2')
+    assert ks.extension(Box_a('a', Atom('p'))) == 0b1
@@ -112,3 +112,42 @@ def test_nodes_not_follow_formula():
     expected_result = ['RRW']
     result = ks.nodes_not_follow_formula(formula)
     assert expected_result == result
+
+
+def test_successors_one_agent():
+    worlds = [World('1', {'p': True}), World('2', {'p': True}), World('3', {'p': True})]
+    relations = {'a': {('1', '2'), ('1', '3'), ('2', '2')}}
+    ks = KripkeStructure(worlds, relations)
+    assert set(ks.successors('a', '1')) == {'2', '3'}
+    assert list(ks.successors('a', '3')) == []
+    assert list(ks.successors('b', '1')) == []
+
+
+def test_successors_set_relations():
+    worlds = [World('1', {'p': True}), World('2', {'p': True})]
+    relations = {('1', '2'), ('2', '2')}
+    ks = KripkeStructure(worlds, relations)
+    assert list(ks.successors(None, '1')) == ['2']
+
+
+def test_remove_node_updates_successors():
+    worlds = [World('1', {'p': True}), World('2', {'p': True}), World('3', {'p': True})]
+    relations = {'a': {('1', '2'), ('1', '3'), ('3', '2')}}
+    ks = KripkeStructure(worlds, relations)
+    assert set(ks.successors('a', '1')) == {'2', '3'}
+    ks.remove_node_by_name('2')
+    assert list(ks.successors('a', '1')) == ['3']
+    assert list(ks.successors('a', '3')) == []
+
+
+def test_solve_unknown_method():
+    ks = KripkeStructure([World('1', {'p': True})], {})
+    with pytest.raises(ValueError):
+        ks.solve(Atom('p'), method='guess')
+
+
+def test_kripke_structure_init_mapping():
+    worlds = {'1': World('1', {'p': True}), '2': World('2', {})}
+    ks = KripkeStructure(worlds, {'a': {('1', '2')}})
+    assert ks.worlds is worlds
+    assert ks.nodes_not_follow_formula(Atom('p')) == ['2']
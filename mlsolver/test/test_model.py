@@ -86,3 +86,53 @@ def test_solve_with_model_second_ann():
     relations_expected.update(Model.add_symmetric_edges(relations_expected))
     ks_expected = KripkeStructure(worlds_expected, relations_expected)
     assert ks_expected.__eq__(model)
+
+
+def first_ann_expected():
+    worlds_expected = [
+        World('RRW', {'1:R': True, '2:R': True, '3:W': True}),
+        World('RRR', {'1:R': True, '2:R': True, '3:R': True}),
+        World('WRR', {'1:W': True, '2:R': True, '3:R': True}),
+
+        World('WWR', {'1:W': True, '2:W': True, '3:R': True}),
+        World('RWR', {'1:R': True, '2:W': True, '3:R': True}),
+        World('WRW', {'1:W': True, '2:R': True, '3:W': True}),
+    ]
+
+    relations_expected = {
+        '1': {('RRW', 'WRW'), ('RWR', 'WWR'), ('WRR', 'RRR')},
+        '2': {('RWR', 'RRR'), ('WRR', 'WWR')},
+        '3': {('RRR', 'RRW'), ('WRW', 'WRR')}
+    }
+
+    relations_expected.update(Model.add_reflexive_edges(worlds_expected, relations_expected))
+    relations_expected.update(Model.add_symmetric_edges(relations_expected))
+    return KripkeStructure(worlds_expected, relations_expected)
+
+
+def test_announce_first_ann():
+    ks = WiseMenWithHat().ks
+    model = ks.announce(Or(Atom('2:R'), Atom('3:R')))
+    assert first_ann_expected().__eq__(model)
+    assert len(ks.worlds) == 8
+
+
+def test_solve_fixpoint_first_ann():
+    ks = WiseMenWithHat().ks
+    model = ks.solve(Or(Atom('2:R'), Atom('3:R')), method='fixpoint')
+    assert first_ann_expected().__eq__(model)
+
+
+def test_solve_fixpoint_second_ann():
+    ks = first_ann_expected()
+    # Unlike the exhaustive search, RRR and WRR are removed together with RRW and WRW
+    model = ks.solve(Box_a('3', Atom('3:R')), method='fixpoint')
+    assert sorted(model.worlds) == ['RWR', 'WWR']
+    assert model.nodes_not_follow_formula(Box_a('3', Atom('3:R'))) == []
+
+
+def test_solve_announcement_second_ann():
+    ks = first_ann_expected()
+    model = ks.solve(Atom('3:R'), method='announcement')
+    assert sorted(model.worlds) == ['RRR', 'RWR', 'WRR', 'WWR']
+    assert model.solve(Box_a('3', Atom('3:R'))).__eq__(model)
@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from mlsolver import parallel
+from mlsolver.formula import Atom, And, Not, Box_a, Diamond_a, Common
+from mlsolver.model import WiseMenWithHat
+
+
+def formulas():
+    return [Atom('1:R'), Box_a('1', Atom('1:R')), And(Not(Box_a('1', Atom('1:R'))), Diamond_a('2', Atom('3:W'))),
+            Common(['1', '2', '3'], Atom('1:R'))]
+
+
+def test_parallel_matches_serial():
+    ks = WiseMenWithHat().ks
+    expected = ks.extensions(formulas())
+    assert parallel.extensions(ks, formulas(), workers=2, threshold=0) == expected
+    assert parallel.nodes_not_follow_formulas(ks, formulas(), workers=2, threshold=0) == \
+        ks.nodes_not_follow_formulas(formulas())
+
+
+def test_parallel_saved_model_and_executor(tmp_path):
+    ks = WiseMenWithHat().ks
+    path = str(tmp_path / 'model.mlks')
+    ks.save(path)
+    with ProcessPoolExecutor(2) as executor:
+        result = parallel.extensions(ks, formulas(), workers=2, threshold=0, path=path, executor=executor)
+    assert result == ks.extensions(formulas())
+    assert (tmp_path / 'model.mlks').exists()
+
+
+def test_parallel_below_threshold_is_serial():
+    ks = WiseMenWithHat().ks
+    assert parallel.extensions(ks, formulas(), executor=object()) == ks.extensions(formulas())
+
+
+def test_parallel_reuses_stored_file(tmp_path, monkeypatch):
+    ks = WiseMenWithHat().ks
+    path = str(tmp_path / 'model.mlks')
+    ks.save(path)
+    loaded = type(ks).load(path)
+    assert ks.stored_path == loaded.stored_path == path
+
+    def save(*args):
+        raise AssertionError("saved again")
+    monkeypatch.setattr(parallel.storage, 'save', save)
+    assert parallel.extensions(loaded, formulas(), workers=2, threshold=0) == ks.extensions(formulas())
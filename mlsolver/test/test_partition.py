@@ -0,0 +1,86 @@
+from mlsolver.formula import Atom, Box_a, Diamond_a, Not
+from mlsolver.kripke import KripkeStructure, World, Partition
+
+
+def make_worlds():
+    return [World('1', {'p': True}), World('2', {'p': True}), World('3', {'p': False}), World('4', {})]
+
+
+def make_partition():
+    return Partition({'1': 0, '2': 0, '3': 1, '4': 1})
+
+
+def make_pairs():
+    return {('1', '1'), ('1', '2'), ('2', '1'), ('2', '2'), ('3', '3'), ('3', '4'), ('4', '3'), ('4', '4')}
+
+
+def test_partition_members():
+    partition = make_partition()
+    assert partition.members == {0: ['1', '2'], 1: ['3', '4']}
+    assert partition.get('3') == ['3', '4']
+    assert partition.get('5') == ()
+
+
+def test_partition_by_key():
+    partition = Partition.by_key(['ab', 'ac', 'bc'], lambda w: w[0])
+    assert partition == Partition({'ab': 'a', 'ac': 'a', 'bc': 'b'})
+
+
+def test_partition_eq_pairs():
+    partition = make_partition()
+    assert partition == make_pairs()
+    assert make_pairs() == partition
+    assert len(partition) == len(make_pairs())
+    assert ('1', '2') in partition
+    assert ('1', '3') not in partition
+    assert ('1', '5') not in partition
+
+
+def test_partition_box_a_same_as_pairs():
+    ks_partition = KripkeStructure(make_worlds(), {'a': make_partition()})
+    ks_pairs = KripkeStructure(make_worlds(), {'a': make_pairs()})
+    for formula in [Box_a('a', Atom('p')), Diamond_a('a', Atom('p')), Box_a('a', Not(Atom('p'))),
+                    Diamond_a('a', Not(Atom('p')))]:
+        for world in ks_pairs.worlds:
+            assert formula.semantic(ks_partition, world) == formula.semantic(ks_pairs, world)
+
+
+def test_partition_remove_node():
+    ks = KripkeStructure(make_worlds(), {'a': make_partition()})
+    formula = Diamond_a('a', Atom('p'))
+    assert formula.semantic(ks, '1')
+    ks.remove_node_by_name('1')
+    ks.remove_node_by_name('2')
+    assert not formula.semantic(ks, '1')
+    assert ks.relations['a'].members == {1: ['3', '4']}
+    assert ks.relations['a'] == {('3', '3'), ('3', '4'), ('4', '3'), ('4', '4')}
+
+
+def test_partition_from_pairs():
+    partition = Partition.from_pairs(make_pairs())
+    assert partition == make_partition()
+    assert sorted(sorted(m) for m in partition.members.values()) == [['1', '2'], ['3', '4']]
+
+
+def test_partition_from_pairs_not_equivalence():
+    assert Partition.from_pairs({('1', '2'), ('2', '1'), ('1', '1')}) is None
+    assert Partition.from_pairs({('1', '2'), ('1', '1'), ('2', '2')}) is None
+    assert Partition.from_pairs({('1', '1')}, ['1', '2']) is None
+    assert Partition.from_pairs(set(), []) == Partition({})
+
+
+def test_partition_none_class_id():
+    partition = Partition({'1': None, '2': None, '3': 0})
+    assert ('1', '2') in partition and ('1', '3') not in partition and ('1', '4') not in partition
+    assert partition.get('1') == ['1', '2']
+    assert partition.get('4') == ()
+
+
+def test_partition_world_in_no_class():
+    worlds = [World('1', {'p': True}), World('2', {}), World('3', {})]
+    ks = KripkeStructure(worlds, {'a': Partition({'1': None, '2': None})})
+    formula = Box_a('a', Atom('p'))
+    # The world in no class must not share the memo of class None
+    assert [formula.semantic(ks, w) for w in ['3', '1', '2']] == [True, False, False]
+    ks.remove_node_by_name('3')
+    assert list(ks.worlds) == ['1', '2'] and ks.relations['a'].get('1') == ['1', '2']
@@ -175,7 +175,7 @@ def test_derive_not_p_and_q():
 
     leaf_q = Leaf('s', 'q', [], False)
     leaf_p = Leaf('s', 'p', [], False)
-    tree_expected = Node('s', Not(Or(Atom('p'), Atom('q'))), [leaf_p, leaf_q])
+    tree_expected = Node('s', Not(And(Atom('p'), Atom('q'))), [leaf_p, leaf_q])
     tree_expected.is_derived = True
     assert tree_expected == tree.root_node
 
@@ -0,0 +1,55 @@
+from mlsolver.formula import Atom, Not, Box_a, Diamond_a, Common
+from mlsolver.kripke import KripkeStructure, World, Partition, CSRRelation
+from mlsolver.model import WiseMenWithHat
+
+
+def structure():
+    worlds = [World('1', {'p': True}), World('2', {'q': True}), World('3', {'p': True})]
+    return KripkeStructure(worlds, {'a': {('1', '2'), ('2', '2'), ('3', '1')},
+                                    'b': Partition({'1': 0, '2': 1, '3': 0})})
+
+
+def test_save_load(tmp_path):
+    ks = structure()
+    ks.save(tmp_path / 'ks.bin')
+    for mmap in [True, False]:
+        loaded = KripkeStructure.load(tmp_path / 'ks.bin', mmap=mmap)
+        assert isinstance(loaded.relations['a'], CSRRelation)
+        assert isinstance(loaded.relations['b'], Partition)
+        assert loaded == ks
+        assert dict(loaded.worlds['2'].assignment) == {'q': True}
+        for formula in [Box_a('a', Atom('p')), Diamond_a('b', Not(Atom('p'))), Common(['a', 'b'], Atom('p'))]:
+            assert loaded.extension(formula) == ks.extension(formula)
+
+
+def test_save_load_wise_men(tmp_path):
+    ks = WiseMenWithHat().ks
+    ks.save(tmp_path / 'ks.bin')
+    loaded = KripkeStructure.load(tmp_path / 'ks.bin')
+    assert loaded == ks
+    loaded.remove_node_by_name('RWW')
+    ks.remove_node_by_name('RWW')
+    assert loaded == ks
+
+
+def test_save_load_unlabelled(tmp_path):
+    ks = KripkeStructure([World('1', {'p': True}), World('2', {})], {('1', '2'), ('2', '2')})
+    ks.save(tmp_path / 'ks.bin')
+    assert KripkeStructure.load(tmp_path / 'ks.bin') == ks
+
+
+def test_load_partition_lazily(tmp_path):
+    worlds = [World('1', {'p': True}), World('2', {}), World('3', {'p': True}), World('4', {})]
+    ks = KripkeStructure(worlds, {'a': Partition({'1': 'x', '2': 'x', '3': 'y'})})
+    ks.save(tmp_path / 'ks.bin')
+    loaded = KripkeStructure.load(tmp_path / 'ks.bin')
+    partition = loaded.relations['a']
+    assert partition.members.decoded == {} and partition.class_of.worlds.ids._index is None
+    assert partition.get('1') == ['1', '2'] and list(partition.members.decoded) == [0]
+    assert partition == ks.relations['a']
+    loaded.remove_node_by_name('2')
+    loaded.remove_node_by_name('4')
+    ks.remove_node_by_name('2')
+    ks.remove_node_by_name('4')
+    assert partition.get('1') == ['1'] and loaded == ks
+    assert loaded.extension(Diamond_a('a', Not(Atom('p')))) == 0
@@ -0,0 +1,51 @@
+import pytest
+
+from mlsolver.formula import Atom, And, Not, Box_a, Diamond_a, Box_star, Common
+from mlsolver.kripke import KripkeStructure, World, Partition
+from mlsolver.model import WiseMenWithHat
+
+
+def structure():
+    worlds = [World('1', {'p': True}), World('2', {'p': False}), World('3', {'p': True}), World('4', {'p': True})]
+    relations = {'a': Partition({'1': 0, '2': 0, '3': 1, '4': 1}),
+                 'b': {('1', '3'), ('3', '2'), ('2', '2'), ('4', '1')}}
+    return KripkeStructure(worlds, relations)
+
+
+def test_restrict():
+    ks = structure()
+    restricted = ks.restrict(['1', '3', '4'])
+    assert list(restricted.worlds) == ['1', '3', '4']
+    assert set(restricted.relations['a']) == {('1', '1'), ('3', '3'), ('3', '4'), ('4', '3'), ('4', '4')}
+    assert restricted.relations['b'] == {('1', '3'), ('4', '1')}
+    # The original is left as it was
+    assert len(ks.worlds) == 4 and ('3', '2') in ks.relations['b']
+
+
+def test_submodel_matches_restrict():
+    ks = structure()
+    for keep in [0b1101, 0b0111, 0b1010, 0b1111, 0]:
+        view = ks.submodel(keep)
+        restricted = ks.restrict(view.worlds)
+        assert list(view.worlds) == list(restricted.worlds)
+        for formula in [Box_a('a', Atom('p')), Diamond_a('b', Not(Atom('p'))), Box_star(Atom('p')),
+                        Common(['b'], Atom('p')), And(Atom('p'), Common(['a', 'b'], Atom('p')))]:
+            expected = restricted.nodes_not_follow_formula(formula)
+            assert view.nodes_not_follow_formula(formula) == expected
+            assert [w for w in view.worlds if not formula.semantic(view, w)] == expected
+
+
+def test_announce_and_fixpoint():
+    ks = WiseMenWithHat().ks
+    formula = Not(Box_a('1', Atom('1:W')))
+    announced = ks.announce(formula)
+    assert list(announced.worlds) == ks.names_of(ks.extension(formula))
+    fixpoint = ks.solve_fixpoint(formula)
+    assert fixpoint.nodes_not_follow_formula(formula) == []
+    assert set(fixpoint.worlds) <= set(announced.worlds)
+
+
+def test_submodel_cannot_change():
+    view = structure().submodel(0b11)
+    with pytest.raises(TypeError):
+        view.remove_node_by_name('1')
@@ -0,0 +1,94 @@
+from collections import namedtuple
+
+from mlsolver.bdd import BDD
+from mlsolver.formula import Atom, And, Or, Not, Box_a, Diamond_a, Box_star, Common, Everybody
+from mlsolver.kripke import KripkeStructure, World, Partition
+from mlsolver.model import WiseMenWithHat
+from mlsolver.symbolic import SymbolicKripkeStructure
+
+Action = namedtuple('Action', ['name', 'precon'])
+ActionModel = namedtuple('ActionModel', ['actions', 'equivs'])
+
+
+def test_bdd_canonical():
+    bdd = BDD()
+    x, y = bdd.var(0), bdd.var(1)
+    assert bdd.conj(x, y) == bdd.conj(y, x)
+    assert bdd.disj(x, bdd.neg(x)) == 1
+    assert bdd.conj(x, bdd.neg(x)) == 0
+    assert bdd.exists([0], bdd.conj(x, y)) == y
+    assert bdd.rename(x, {0: 1}) == y
+
+
+def test_bdd_count_and_exactly():
+    bdd = BDD()
+    u = bdd.exactly([0, 2, 4], 2)
+    assert bdd.count(u, [0, 2, 4]) == 3
+    assert bdd.count(u, [0, 1, 2, 4]) == 6
+    assert sorted(sorted(a) for a in bdd.assignments(u, [0, 2, 4])) == [[0, 2], [0, 4], [2, 4]]
+    assert bdd.count(1, [0, 1]) == 4
+
+
+def wise_men_formulas():
+    return [Box_a('1', Atom('1:R')), Diamond_a('2', Atom('1:W')),
+            And(Not(Box_a('1', Atom('1:R'))), Not(Box_a('1', Not(Atom('1:R'))))),
+            Box_star(Or(Atom('2:R'), Atom('3:R'))), Common(['1', '2'], Or(Atom('1:R'), Atom('2:R'))),
+            Everybody(['1', '3'], Or(Atom('1:R'), Atom('2:R'))), Common(['3'], Atom('3:R'))]
+
+
+def symbolic_names(ks, symbolic, bits):
+    true_sets = set(symbolic.assignments(bits))
+    return [name for name, world in ks.worlds.items()
+            if frozenset(p for p, v in world.assignment.items() if v) in true_sets]
+
+
+def test_symbolic_matches_explicit():
+    ks = WiseMenWithHat().ks
+    symbolic = SymbolicKripkeStructure.from_kripke(ks)
+    assert symbolic.count() == 8
+    for formula in wise_men_formulas():
+        assert symbolic_names(ks, symbolic, symbolic.extension(formula)) == ks.names_of(ks.extension(formula))
+
+
+def test_symbolic_product_update():
+    worlds = [World('pq', {'p': True, 'q': True}), World('p', {'p': True}), World('q', {'q': True})]
+    ks = KripkeStructure(worlds, {'a': Partition.by_key(['pq', 'p', 'q'], lambda w: 0),
+                                  'b': Partition.by_key(['pq', 'p', 'q'], lambda w: 'p' in w)})
+    model = ActionModel([Action('tell_p', Atom('p')), Action('tell_q', Atom('q')), Action('skip', Or(Atom('p'), Not(Atom('p'))))],
+                        {'a': {(x, x) for x in ['tell_p', 'tell_q', 'skip']},
+                         'b': {(x, y) for x in ['tell_p', 'tell_q', 'skip'] for y in ['tell_p', 'tell_q', 'skip']}})
+    symbolic = SymbolicKripkeStructure.from_kripke(ks).product_update(model)
+
+    # The same product, built explicitly
+    pairs = [(w, a) for w in worlds for a in model.actions if a.precon.semantic(ks, w.name)]
+    product = KripkeStructure([World(w.name + ',' + a.name, w.assignment) for (w, a) in pairs],
+                              {agent: {(w.name + ',' + a.name, v.name + ',' + b.name) for (w, a) in pairs for (v, b) in pairs
+                                       if (w.name, v.name) in ks.relations[agent] and (a.name, b.name) in model.equivs[agent]}
+                               for agent in ['a', 'b']})
+    assert symbolic.count() == len(product.worlds) == 7
+    for formula in [Box_a('a', Atom('p')), Diamond_a('a', Not(Atom('q'))), Box_a('b', Atom('p')),
+                    Common(['a', 'b'], Or(Atom('p'), Atom('q'))), Box_a('a', Box_a('b', Atom('q')))]:
+        assert symbolic.count(symbolic.extension(formula)) == len(product.names_of(product.extension(formula)))
+
+
+def test_symbolic_initial_deal_model():
+    # Three players dealt roles w, w, t: each player only knows their own role
+    symbolic = SymbolicKripkeStructure([r + i for i in 'abc' for r in 'tw'])
+    symbolic.worlds = symbolic.exactly(['ta', 'tb', 'tc'], 1) & symbolic.exactly(['wa', 'wb', 'wc'], 2)
+    for i in 'abc':
+        symbolic.worlds = symbolic.worlds & symbolic.exactly(['t' + i, 'w' + i], 1)
+        symbolic.relations[i] = symbolic.same(['t' + i, 'w' + i])
+    assert symbolic.count() == 3
+    assert symbolic.valid(Or(Atom('ta'), Atom('wa')))
+    assert symbolic.count(symbolic.extension(Box_a('a', Atom('wb')))) == 1
+    assert not symbolic.valid(Common(['a', 'b', 'c'], Atom('wa')))
+    assert symbolic.valid(Common(['a', 'b', 'c'], Or(Atom('wa'), Atom('wb'))))
+
+
+def test_bdd_rename_order():
+    bdd = BDD()
+    u = bdd.conj(bdd.var(0), bdd.neg(bdd.var(2)))
+    assert bdd.rename(u, {0: 1, 2: 3}) == bdd.conj(bdd.var(1), bdd.neg(bdd.var(3)))
+    # Swapping the order, and leaving a level unrenamed, needs the general case
+    assert bdd.rename(u, {0: 3, 2: 1}) == bdd.conj(bdd.var(3), bdd.neg(bdd.var(1)))
+    assert bdd.rename(u, {0: 5}) == bdd.conj(bdd.var(5), bdd.neg(bdd.var(2)))
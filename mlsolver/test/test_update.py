@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+
+import pytest
+
+from mlsolver.formula import Atom, And, Or, Not, Box_a, Diamond_a, Everybody, Common, Update, translate
+from mlsolver.kripke import KripkeStructure, UpdatedKripkeStructure, World, Partition
+
+
+def coin():
+    # The coin shows heads (h) or not, and neither agent knows which
+    worlds = [World('H', {'h': True}), World('T', {'h': False})]
+    return KripkeStructure(worlds, {'a': Partition({'H': 0, 'T': 0}), 'b': {('H', 'H'), ('H', 'T'),
+                                                                          ('T', 'H'), ('T', 'T')}})
+
+
+def peek():
+    # a privately looks at the coin; b only knows that a looked
+    actions = [SimpleNamespace(name='h', precon=Atom('h')), SimpleNamespace(name='t', precon=Not(Atom('h')))]
+    return SimpleNamespace(actions=actions,
+                           equivs={'a': Partition({'h': 0, 't': 1}), 'b': {('h', 'h'), ('h', 't'), ('t', 'h'), ('t', 't')}})
+
+
+def test_updated_worlds():
+    ks = UpdatedKripkeStructure(coin(), [peek()])
+    assert list(ks.worlds) == [('H', 'h'), ('T', 't')]
+    assert ('H', 'h') in ks.worlds and ('H', 't') not in ks.worlds and ('X', 'h') not in ks.worlds
+    assert ks.worlds[('T', 't')].assignment == {'h': False}
+
+
+def test_updated_semantic():
+    ks = UpdatedKripkeStructure(coin(), [peek()])
+    assert ks.evaluate(Box_a('a', Atom('h')), ('H', 'h'))
+    assert not ks.evaluate(Box_a('b', Atom('h')), ('H', 'h'))
+    # b knows that a knows whether the coin shows heads
+    assert ks.evaluate(Box_a('b', Or(Box_a('a', Atom('h')), Box_a('a', Not(Atom('h'))))), ('H', 'h'))
+    assert not ks.evaluate(Box_a('b', Box_a('a', Atom('h'))), ('H', 'h'))
+
+
+def test_updated_chain_matches_materialized():
+    ks = UpdatedKripkeStructure(coin(), [peek(), peek()])
+    full = ks.materialize()
+    assert len(full.worlds) == 2
+    for formula in [Box_a('a', Atom('h')), Box_a('b', Atom('h')), Diamond_a('b', And(Atom('h'), Box_a('a', Atom('h'))))]:
+        assert [w for w in full.worlds if ks.evaluate(formula, w)] == full.names_of(full.extension(formula))
+
+
+def test_update_translation_matches_product():
+    ks = coin()
+    model = peek()
+    updated = UpdatedKripkeStructure(ks, [model])
+    for inner in [Atom('h'), Box_a('a', Atom('h')), Box_a('b', Atom('h')), Not(Box_a('b', Not(Atom('h')))),
+                  Box_a('b', Or(Box_a('a', Atom('h')), Box_a('a', Not(Atom('h'))))),
+                  Diamond_a('b', And(Not(Atom('h')), Box_a('a', Not(Atom('h'))))),
+                  Everybody(['a', 'b'], Diamond_a('a', Atom('h')))]:
+        for action in ['h', 't']:
+            formula = Update(model, action, inner)
+            static = translate(formula)
+            for world in ks.worlds:
+                expected = (world, action) not in updated.worlds or updated.evaluate(inner, (world, action))
+                assert static.semantic(ks, world) == expected, (str(formula), world)
+                assert formula.semantic(ks, world) == expected
+            assert ks.names_of(ks.extension(formula)) == [w for w in ks.worlds if formula.semantic(ks, w)]
+
+
+def test_update_translation_nested_and_shared():
+    model = peek()
+    formula = Update(model, 'h', Update(model, 'h', Box_a('a', Atom('h'))))
+    assert translate(formula) is translate(Update(model, 'h', Update(model, 'h', Box_a('a', Atom('h')))))
+    assert all(formula.semantic(coin(), w) for w in ['H', 'T'])
+    with pytest.raises(ValueError):
+        translate(Update(model, 'h', Common(['a', 'b'], Atom('h'))))
+
+
+def test_update_translation_reduces_each_subformula_once(monkeypatch):
+    from mlsolver import formula as formula_module
+    calls = []
+    reduce = formula_module._reduce
+
+    def counting(action_model, action, inner):
+        calls.append((action, str(inner)))
+        return reduce(action_model, action, inner)
+
+    monkeypatch.setattr(formula_module, '_reduce', counting)
+    model = peek()
+    inner = Box_a('b', Box_a('a', Box_a('b', Box_a('a', Box_a('b', Not(Atom('h')))))))
+    translate(Update(model, 'h', inner))
+    # One reduction per action and subformula (7 subformulas, 2 actions) at most
+    assert len(calls) == len(set(calls)) <= 14
+    updated = UpdatedKripkeStructure(coin(), [model])
+    assert Update(model, 'h', inner).semantic(coin(), 'H') == updated.evaluate(inner, ('H', 'h'))
+
+
+def test_update_reductions_freed_with_action_model():
+    import gc
+    import weakref
+
+    class ActionModel:
+        # Like peek(), but weakly referable
+        def __init__(self, actions, equivs):
+            self.actions = actions
+            self.equivs = equivs
+
+    model = ActionModel(peek().actions, peek().equivs)
+    translate(Update(model, 'h', Box_a('b', Box_a('a', Atom('h')))))
+    assert model._reductions.translations
+    reference = weakref.ref(model)
+    del model
+    gc.collect()
+    assert reference() is None
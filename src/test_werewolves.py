@@ -0,0 +1,68 @@
+from itertools import permutations
+
+import pytest
+
+# The game script plots its models, so it needs the plotting libraries even when only its models are tested.
+pytest.importorskip("networkx")
+pytest.importorskip("matplotlib")
+pytest.importorskip("pygraphviz")
+
+from werewolves import WerewolvesGame, ActionModel, Deals, DealWorlds, RolePartition
+
+
+def test_compose_no_action_models():
+    g = WerewolvesGame("tw")
+    worlds = set(g.kripke.worlds)
+    relations = {agent: set(relation) for agent, relation in g.kripke.relations.items()}
+    g.apply_action_model(ActionModel.compose([], g.kripke))
+    assert set(g.kripke.worlds) == {name + ",skip" for name in worlds}
+    for agent, pairs in relations.items():
+        assert set(g.kripke.relations[agent]) == {(w + ",skip", v + ",skip") for (w, v) in pairs}
+
+
+def test_deals_are_distinct_permutations():
+    deals = Deals("wwtsm")
+    expected = sorted(set("".join(p) for p in permutations("wwtsm")))
+    assert list(deals.deals()) == expected
+    assert deals.total == len(expected)
+    assert [deals.rank(deal) for deal in expected] == list(range(len(expected)))
+    assert [deals.unrank(i) for i in range(len(expected))] == expected
+
+
+def test_deals_with_role():
+    deals = Deals("wwtsm")
+    assert list(deals.with_role(2, "w")) == [d for d in deals.deals() if d[2] == "w"]
+    assert list(deals.with_role(0, "s")) == [d for d in deals.deals() if d[0] == "s"]
+
+
+def test_is_deal():
+    deals = Deals("wwt")
+    assert deals.is_deal("wtw")
+    assert not deals.is_deal("www")
+    assert not deals.is_deal("ww")
+    assert not deals.is_deal(("w", "w", "t"))
+
+
+def test_deal_worlds_ids_and_names():
+    g = WerewolvesGame("wwts")
+    ks = g.kripke
+    names = list(ks.worlds)
+    assert ks.world_ids() is ks.worlds.ids
+    assert [ks.world_ids()[name] for name in names] == list(range(len(names)))
+    assert ks.names_of(ks.all_worlds()) == names
+    assert ks.worlds["wtsw"].assignment == {"wa": True, "tb": True, "sc": True, "wd": True}
+
+
+def test_role_classes_after_removal():
+    worlds = DealWorlds("wwt")
+    partition = RolePartition(worlds, 0)
+    assert dict(partition.class_of) == {"tww": "t", "wtw": "w", "wwt": "w"}
+    assert partition.members["w"] == ["wtw", "wwt"]
+    worlds.pop("wtw")
+    partition.remove("wtw")
+    assert "wtw" not in partition.class_of
+    assert partition.members["w"] == ["wwt"]
+    assert worlds.world_ids() is None
+    # Classes generated after the removal leave the removed world out as well
+    other = RolePartition(worlds, 1)
+    assert dict(other.members) == {"w": ["tww", "wwt"]}
@@ -1,6 +1,6 @@
 from mlsolver.kripke import *
 from mlsolver.formula import *
-from more_itertools import distinct_permutations as dp
+from mlsolver.symbolic import SymbolicKripkeStructure
 import networkx as nx
 import matplotlib.pyplot as plt
 from functools import reduce
@@ -8,20 +8,74 @@ import pygraphviz
 import sys
 import string
 import math
+import os
+import json
+import hashlib
+import tempfile
+from collections import Counter
+from collections.abc import Mapping, Sequence
+import mlsolver
+import mlsolver.parallel
 
 
 AGENTS = string.ascii_lowercase
 ROLES = ['t', 'w', 's', 'f', 'm']
 
 class WerewolvesGame:
-    def __init__(self, roles):
+    def __init__(self, roles, contract=False, symbolic=False, cache=None, parallel=False):
         self.num_players = len(roles)
         self.roles = roles
-        # Worlds are given by distinct permutations of the multiset of roles.
-        worlds = [World(''.join(x), {r + AGENTS[i]: True for (i, r) in enumerate(x)}) for x in dp(roles)]
-        # Agents can't distinguish between worlds where they have the same role.
-        relations = {AGENTS[i]: set((a.name, b.name) for a in worlds for b in worlds if a.name[i] == b.name[i]) for i in range(self.num_players)}
+        # If set, every updated model is replaced by its bisimulation contraction.
+        self.contract = contract
+        # If set, the model is encoded as BDDs (see mlsolver.symbolic) instead of explicit worlds and relations.
+        self.symbolic = symbolic
+        # If set, preconditions are evaluated in a process pool over shards of the worlds (see mlsolver.parallel) once
+        # a model is large enough. The workers read the model from its cache file. Without a cache, each model is
+        # saved to a temporary file for them, which costs more than evaluating its preconditions serially.
+        self.parallel = parallel and not symbolic
+        # If set, a PipelineCache that updated models and layouts are looked up in and stored to. Symbolic models are
+        # not cached. The key identifies the current model by everything it was computed from.
+        self.cache = None if symbolic else cache
+        self.key = cache.key(PipelineCache.version(), roles, contract) if self.cache is not None else None
+        if symbolic:
+            self.kripke = self.symbolic_model()
+            return
+        # Worlds are given by distinct permutations of the multiset of roles. They are only represented by the multiset
+        # itself, and created when a query touches them.
+        worlds = DealWorlds(roles)
+        # Agents can't distinguish between worlds where they have the same role. These are equivalence relations, so
+        # they are stored as partitions by that role instead of as sets of pairs.
+        relations = {AGENTS[i]: RolePartition(worlds, i) for i in range(self.num_players)}
         self.kripke = KripkeStructure(worlds, relations)
+        if self.parallel and self.cache is not None:
+            self.cache.store_model(self.key, self.kripke)
+
+    def symbolic_model(self):
+        # Each player has exactly one role and each role is dealt as often as it occurs in the multiset of roles.
+        counts = Counter(self.roles)
+        agents = AGENTS[:self.num_players]
+        ks = SymbolicKripkeStructure(r + i for i in agents for r in sorted(counts))
+        worlds = ks.bdd.function(1)
+        for i in agents:
+            worlds &= ks.exactly([r + i for r in counts], 1)
+        for r, c in counts.items():
+            worlds &= ks.exactly([r + i for i in agents], c)
+        ks.worlds = worlds
+        # Agents can't distinguish between worlds where they have the same role.
+        ks.relations = {i: ks.same([r + i for r in counts]) for i in agents}
+        return ks
+
+    def lazy_update(self, action_models):
+        # The model after applying the action models, without building it: worlds are named by tuples (deal, action,
+        # ...) and only generated when a query touches them, so targeted queries only cost what they visit.
+        return UpdatedKripkeStructure(self.kripke, action_models)
+
+    def after(self, action_models, actions, formula):
+        # The formula that holds in a deal iff the given formula holds after the given actions of the action models
+        # happened in it. It is checked on the initial model by translating it to a formula without updates.
+        for action_model, action in reversed(list(zip(action_models, actions))):
+            formula = Update(action_model, action, formula)
+        return formula
 
     def plot_knowledge(self, layout="neato", pos=None):
         G = nx.DiGraph()
@@ -29,11 +83,15 @@ class WerewolvesGame:
         # Edges drawn are given by the union of all agents' relations, with the labels depending on which agents' relations
         # the edge comes from.
         edges     = [(w, v, {'label': ''.join([a for a in AGENTS[:self.num_players] if (w,v) in self.kripke.relations[a]])})
-                     for (w, v) in reduce(lambda x, y : x.union(y), self.kripke.relations.values()) if w != v]
+                     for (w, v) in set().union(*self.kripke.relations.values()) if w != v]
         G.add_nodes_from(nodes)
         G.add_edges_from(edges) 
         if pos is None:
-            pos = nx.nx_agraph.graphviz_layout(G, layout)
+            pos = self.cache.load_layout(self.key, layout) if self.cache is not None else None
+            if pos is None:
+                pos = nx.nx_agraph.graphviz_layout(G, layout)
+                if self.cache is not None:
+                    self.cache.save_layout(self.key, layout, pos)
         else:
             # Reuse positions for the appropriate worlds if possible.
             pos = {a: pos[a1] for a in nodes for a1 in pos.keys() if a.startswith(a1)}
@@ -51,25 +109,378 @@ class WerewolvesGame:
         return pos
 
     def apply_action_model(self, action_model):
-        worlds = self.kripke.worlds.values()
-        
-        # New worlds: (w,a) for w |= pre(a)
-        new_world_pairs = [(w, a) for w in worlds for a in action_model.actions if a.precon.semantic(self.kripke, w.name)]
+        if self.symbolic:
+            self.kripke = self.kripke.product_update(action_model)
+            return
+        if self.cache is not None:
+            self.key = self.cache.key(self.key, action_model.key)
+            cached = self.cache.load_model(self.key)
+            if cached is not None:
+                self.kripke = cached
+                return
+        self.kripke = self.product(action_model)
+        if self.cache is not None:
+            self.cache.save_model(self.key, self.kripke)
+
+    def product(self, action_model):
+        # New worlds: (w,a) for w |= pre(a), read off the nonzeros of the precondition matrix in world order
+        columns = action_model.precondition_matrix(self.kripke, self.parallel)
+        rows = {}
+        for a, column in zip(action_model.actions, columns):
+            while column:
+                low = column & -column
+                rows.setdefault(low.bit_length() - 1, []).append(a)
+                column ^= low
+        names = self.kripke.names_of(reduce(lambda x, y: x | y, columns, 0))
+        new_world_pairs = [(self.kripke.worlds[name], a) for (name, i) in zip(names, sorted(rows)) for a in rows[i]]
         new_worlds = [World(f"{w.name},{a.name}", w.assignment) for (w,a) in new_world_pairs]
 
-        # New relation (per agent) requires both the worlds and associated actions to be related under the old models
-        new_relations = {i: set((f"{w1.name},{a1.name}", f"{w2.name},{a2.name}") 
-                                for (w1, a1) in new_world_pairs for (w2, a2) in new_world_pairs
-                                if (w1.name, w2.name) in self.kripke.relations[i] and 
-                                   (a1.name, a2.name) in action_model.equivs[i])
-                            for i in AGENTS[:self.num_players]}
+        new_relations = {}
+        for i in AGENTS[:self.num_players]:
+            relation = self.kripke.relations[i]
+            action_partition = action_model.partition(i)
+            if isinstance(relation, Partition) and action_partition is not None:
+                # If both relations are equivalences, the new classes are the intersections of world classes and
+                # action classes, so we only need to group the new worlds by the pair of their old classes.
+                class_ids = {}
+                # Look up each old world's class once, not once per action applied to it
+                world_class = {name: relation.class_of[name] for name in names}
+                new_relations[i] = Partition({
+                    v.name: class_ids.setdefault((world_class[w.name], action_partition.class_of[a.name]),
+                                                 len(class_ids))
+                    for (v, (w, a)) in zip(new_worlds, new_world_pairs)})
+            else:
+                # New relation requires both the worlds and associated actions to be related under the old models.
+                # It is stored in CSR form, which takes a few bytes per pair.
+                new_relations[i] = CSRRelation.from_pairs(((v1.name, v2.name)
+                                       for (v1, (w1, a1)) in zip(new_worlds, new_world_pairs)
+                                       for (v2, (w2, a2)) in zip(new_worlds, new_world_pairs)
+                                       if (w1.name, w2.name) in relation and
+                                          (a1.name, a2.name) in action_model.equivs[i]),
+                                       [v.name for v in new_worlds])
         
-        self.kripke = KripkeStructure(new_worlds, new_relations)
+        product = KripkeStructure(new_worlds, new_relations)
+        if self.contract:
+            product = product.bisimulation_contraction()
+        return product
     
+class Deals:
+    # Ranks, unranks and enumerates the distinct permutations (deals) of a multiset of roles in lexicographic order.
+    def __init__(self, roles):
+        self.counts = Counter(roles)
+        self.size = len(roles)
+        self.sorted = ''.join(sorted(roles))
+        self.roles = sorted(self.counts)
+        self.total = self.count()
+
+    def count(self):
+        # Number of distinct permutations of the multiset.
+        result = math.factorial(self.size)
+        for c in self.counts.values():
+            result //= math.factorial(c)
+        return result
+
+    def unrank(self, rank):
+        # The deal of a rank. Of the deals of the remaining roles, a share count/remaining starts with each role, so
+        # the number of deals following each choice is updated without recounting.
+        counts = [self.counts[role] for role in self.roles]
+        remaining = self.size
+        following = self.total
+        deal = []
+        for _ in range(self.size):
+            for k, role in enumerate(self.roles):
+                if counts[k] == 0:
+                    continue
+                starting = following * counts[k] // remaining
+                if rank < starting:
+                    deal.append(role)
+                    following = starting
+                    counts[k] -= 1
+                    remaining -= 1
+                    break
+                rank -= starting
+        return ''.join(deal)
+
+    def rank(self, deal):
+        # The number of deals before the deal in lexicographic order, counted as in unrank().
+        counts = [self.counts[role] for role in self.roles]
+        remaining = self.size
+        following = self.total
+        rank = 0
+        for role in deal:
+            k = self.roles.index(role)
+            for j in range(k):
+                rank += following * counts[j] // remaining
+            following = following * counts[k] // remaining
+            counts[k] -= 1
+            remaining -= 1
+        return rank
+
+    def deals(self, counts=None):
+        # All deals of a multiset of roles, given by its role counts, in lexicographic order. Each deal is the next
+        # permutation of the previous one, so no deal is unranked from scratch.
+        deal = sorted((self.counts if counts is None else counts).elements())
+        while True:
+            yield ''.join(deal)
+            i = len(deal) - 2
+            while i >= 0 and deal[i] >= deal[i + 1]:
+                i -= 1
+            if i < 0:
+                return
+            j = len(deal) - 1
+            while deal[j] <= deal[i]:
+                j -= 1
+            deal[i], deal[j] = deal[j], deal[i]
+            deal[i + 1:] = reversed(deal[i + 1:])
+
+    def is_deal(self, name):
+        # Sorting the few roles of a name is much cheaper than counting them.
+        return isinstance(name, str) and len(name) == self.size and ''.join(sorted(name)) == self.sorted
+
+    def with_role(self, position, role):
+        # All deals giving the role to the player at the position, in lexicographic order.
+        for rest in self.deals(self.counts - Counter(role)):
+            yield rest[:position] + role + rest[position:]
+
+
+class DealWorlds(Mapping):
+    # The worlds of the initial model, by name. A world's name is its deal and its id is the deal's rank, so worlds
+    # are only created when they are looked up, and their ids and names don't need a list of all deals (see
+    # KripkeStructure.world_ids()). Their assignments are bits over one shared vocabulary.
+    def __init__(self, roles):
+        self.deals = Deals(roles)
+        self.vocabulary = Vocabulary(r + AGENTS[i] for i in range(len(roles)) for r in ROLES)
+        # The bit of each role at each position, so that assignments are built without interning their variables.
+        self.bits = [{r: 1 << self.vocabulary.intern(r + AGENTS[i]) for r in ROLES} for i in range(len(roles))]
+        self.ids = DealIds(self.deals)
+        self.names = DealNames(self.deals)
+        self.removed = set()
+
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        bits = 0
+        for (i, r) in enumerate(name):
+            bits |= self.bits[i][r]
+        return World(name, BitAssignment(bits, self.vocabulary))
+
+    def __contains__(self, name):
+        return self.deals.is_deal(name) and name not in self.removed
+
+    def __iter__(self):
+        for name in self.deals.deals():
+            if name not in self.removed:
+                yield name
+
+    def __len__(self):
+        return self.deals.total - len(self.removed)
+
+    def pop(self, name):
+        world = self[name]
+        self.removed.add(name)
+        return world
+
+    def world_ids(self):
+        # Once worlds are removed, the ranks of the remaining deals are no longer consecutive.
+        return None if self.removed else self.ids
+
+    def world_names(self):
+        return None if self.removed else self.names
+
+
+class DealIds(Mapping):
+    # The id of each deal: its rank. Deals are ranked one at a time until a quarter of them have been looked up. A
+    # query that looks up that many visits most worlds, so then all deals are indexed at once, which is cheaper.
+    def __init__(self, deals):
+        self.deals = deals
+        self.lookups = 0
+        self.index = None
+
+    def __getitem__(self, name):
+        if self.index is not None:
+            return self.index[name]
+        if not self.deals.is_deal(name):
+            raise KeyError(name)
+        self.lookups += 1
+        if self.lookups > self.deals.total // 4:
+            self.index = {deal: i for (i, deal) in enumerate(self.deals.deals())}
+        return self.deals.rank(name)
+
+    def __contains__(self, name):
+        return self.deals.is_deal(name)
+
+    def __iter__(self):
+        return self.deals.deals()
+
+    def __len__(self):
+        return self.deals.total
+
+
+class DealNames(Sequence):
+    # The deal of each id, by unranking it, until a quarter of them have been looked up as in DealIds.
+    def __init__(self, deals):
+        self.deals = deals
+        self.lookups = 0
+        self.list = None
+
+    def __getitem__(self, i):
+        if self.list is not None:
+            return self.list[i]
+        if i < 0:
+            i += self.deals.total
+        if not 0 <= i < self.deals.total:
+            raise IndexError(i)
+        self.lookups += 1
+        if self.lookups > self.deals.total // 4:
+            self.list = list(self.deals.deals())
+        return self.deals.unrank(i)
+
+    def __len__(self):
+        return self.deals.total
+
+
+class RolePartition(Partition):
+    # Partition of the initial worlds by the role of one player, with classes generated when they are first needed.
+    def __init__(self, worlds, position):
+        Partition.__init__(self, RoleAt(worlds, position), RoleClasses(worlds, position))
+
+    def remove(self, world):
+        # Worlds are removed from the world mapping itself, which the classes are filtered by.
+        self.members.discard(world)
+
+
+class RoleAt(Mapping):
+    # Class id of each initial world: the role at one position.
+    def __init__(self, worlds, position):
+        self.worlds = worlds
+        self.position = position
+
+    def __getitem__(self, name):
+        if name not in self.worlds:
+            raise KeyError(name)
+        return name[self.position]
+
+    def __iter__(self):
+        return iter(self.worlds)
+
+    def __len__(self):
+        return len(self.worlds)
+
+
+class RoleClasses(Mapping):
+    # Members of each class of a RolePartition, generated per role when first needed.
+    def __init__(self, worlds, position):
+        self.worlds = worlds
+        self.position = position
+        self.classes = {}
+
+    def __getitem__(self, role):
+        if role not in self.classes:
+            members = [w for w in self.worlds.deals.with_role(self.position, role) if w not in self.worlds.removed]
+            if not members:
+                raise KeyError(role)
+            self.classes[role] = members
+        return self.classes[role]
+
+    def __iter__(self):
+        for role in sorted(self.worlds.deals.counts):
+            if role in self:
+                yield role
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def discard(self, world):
+        members = self.classes.get(world[self.position])
+        if members is not None:
+            members.remove(world)
+            if not members:
+                del self.classes[world[self.position]]
+
+
 class ActionModel:
-    def __init__(self, actions, equivs):
+    def __init__(self, actions, equivs, key=None):
         self.actions = actions
+        # Identifies the action model for PipelineCache keys, e.g. by its class and constructor arguments.
+        self.key = key
+        # Per agent, either a set of pairs of action names or a Partition of the action names, which behaves like the
+        # set of its pairs without storing them.
         self.equivs = equivs
+        self.partitions = {}
+
+    @staticmethod
+    def involvement_partition(actions, involved):
+        # Actions the agent is not involved in are indistinguishable to it, and each action it is involved in is only
+        # related to itself. Built in linear time in the number of actions.
+        return Partition.by_key([u.name for u in actions], lambda name: name if involved(name) else None)
+
+    def partition(self, agent):
+        # The agent's equivalence as a partition of the actions, or None if it is not an equivalence relation.
+        if agent not in self.partitions:
+            equiv = self.equivs[agent]
+            if not isinstance(equiv, Partition):
+                equiv = Partition.from_pairs(equiv, [a.name for a in self.actions])
+            self.partitions[agent] = equiv
+        return self.partitions[agent]
+
+    @staticmethod
+    def compose(action_models, ks=None):
+        # The product of action models applied one after another, as one action model. A composed action is a sequence
+        # of actions, one from each model, and two of them are indistinguishable iff their actions are pairwise
+        # indistinguishable. Preconditions are conjoined, which is exact because all preconditions only talk about the
+        # roles, which actions don't change. If a Kripke structure is given, composed actions whose precondition holds
+        # in none of its worlds are pruned while composing. Composing no action models gives the identity action model:
+        # one action that is always possible and that every agent of ks, if given, can tell apart from nothing else.
+        if not action_models:
+            skip = Action("skip", Or(Atom("skip"), Not(Atom("skip"))))
+            agents = ks.relations if ks is not None else []
+            return ActionModel([skip], {agent: Partition({skip.name: 0}) for agent in agents}, ("compose",))
+        actions = [Action(None, None)]
+        sequences = [()]
+        # The worlds of ks where each composed action's precondition holds, so pruning only intersects bitsets
+        columns = [None]
+        for action_model in action_models:
+            new_actions = []
+            new_sequences = []
+            new_columns = []
+            for u, sequence, column in zip(actions, sequences, columns):
+                for v in action_model.actions:
+                    if ks is not None:
+                        extension = ks.extension(v.precon)
+                        if column is not None:
+                            extension = column & extension
+                        if extension == 0:
+                            continue
+                        new_columns.append(extension)
+                    else:
+                        new_columns.append(None)
+                    precon = v.precon if u.precon is None else And(u.precon, v.precon)
+                    new_actions.append(Action(v.name if u.name is None else f"{u.name},{v.name}", precon))
+                    new_sequences.append(sequence + (v,))
+            actions = new_actions
+            sequences = new_sequences
+            columns = new_columns
+        equivs = {}
+        for agent in set().union(*(m.equivs for m in action_models)):
+            partitions = [m.partition(agent) for m in action_models]
+            if all(p is not None for p in partitions):
+                equivs[agent] = Partition({u.name: tuple(p.class_of[v.name] for (p, v) in zip(partitions, sequence))
+                                           for (u, sequence) in zip(actions, sequences)})
+            else:
+                equivs[agent] = set((u1.name, u2.name)
+                                    for (u1, s1) in zip(actions, sequences) for (u2, s2) in zip(actions, sequences)
+                                    if all((v1.name, v2.name) in m.equivs[agent]
+                                           for (m, v1, v2) in zip(action_models, s1, s2)))
+        return ActionModel(actions, equivs, ("compose",) + tuple(m.key for m in action_models))
+
+    def precondition_matrix(self, ks, parallel=False):
+        # The boolean worlds x actions matrix of which preconditions hold where, as one column per action. A column is
+        # the bitset of the worlds (by ks.world_ids()) where the action's precondition holds, so all worlds are
+        # evaluated at once and shared subformulas like atoms are only evaluated once. If parallel, the worlds are
+        # split over a process pool instead.
+        if parallel:
+            return mlsolver.parallel.extensions(ks, [a.precon for a in self.actions])
+        return [ks.extension(a.precon) for a in self.actions]
 
     def plot(self, layout="neato"):
         G = nx.DiGraph()
@@ -77,7 +488,7 @@ class ActionModel:
         # Edges drawn are given by the union of all agents' relations, with the labels depending on which agents' relations
         # the edge comes from.
         edges     = [(w, v, {'label': ''.join([a for a in AGENTS[:len(self.equivs.keys())] if (w,v) in self.equivs[a]])})
-                     for (w, v) in reduce(lambda x, y : x.union(y), self.equivs.values()) if w != v]
+                     for (w, v) in set().union(*self.equivs.values()) if w != v]
         G.add_nodes_from(nodes)
         G.add_edges_from(edges) 
         pos = nx.nx_agraph.graphviz_layout(G, layout)
@@ -100,22 +511,15 @@ class WerewolfActionModel(ActionModel):
         actions = [Action(f"w{i}{j}", And(Atom(f"w{i}"), Atom(f"w{j}"))) 
                     for i in agents for j in agents 
                     if i < j]
-        equivs = {a: set((u.name, v.name) for u in actions for v in actions 
-                        if (u.name[1] != a and u.name[2] != a and
-                            v.name[1] != a and v.name[2] != a) 
-                            or u == v)
-                    for a in agents}
-        ActionModel.__init__(self, actions, equivs)
+        equivs = {a: ActionModel.involvement_partition(actions, lambda name: a in name[1:3]) for a in agents}
+        ActionModel.__init__(self, actions, equivs, ("werewolf", num_players))
         
 class MasonActionModel(ActionModel):
     def __init__(self, num_players):
         agents = AGENTS[:num_players]
         actions = [Action(f"m{i}{j}", And(Atom(f"m{i}"), Atom(f"m{j}"))) for i in agents for j in agents if i < j]
-        equivs = {a: set((u.name, v.name) for u in actions for v in actions 
-                            if (u.name[1] != a and u.name[2] != a and
-                               v.name[1] != a and v.name[2] != a) or u == v)
-                    for a in agents}
-        ActionModel.__init__(self, actions, equivs)
+        equivs = {a: ActionModel.involvement_partition(actions, lambda name: a in name[1:3]) for a in agents}
+        ActionModel.__init__(self, actions, equivs, ("mason", num_players))
 
 class FamiliarActionModel(ActionModel):
     def __init__(self, num_players, num_werewolves):
@@ -129,11 +533,8 @@ class FamiliarActionModel(ActionModel):
             actions = [Action(f"F{i}W{j}", And(Atom(f"f{i}"), Atom(f"w{j}"))) 
                         for i in agents for j in agents
                         if i != j]
-        equivs = {a: set((u.name, v.name) 
-                        for u in actions for v in actions
-                        if (u.name[1] != a and v.name[1] != a) or u == v)
-                    for a in agents}
-        ActionModel.__init__(self, actions, equivs)
+        equivs = {a: ActionModel.involvement_partition(actions, lambda name: name[1] == a) for a in agents}
+        ActionModel.__init__(self, actions, equivs, ("familiar", num_players, num_werewolves))
 
 class SeerActionModel(ActionModel):
     def __init__(self, num_players):
@@ -141,50 +542,182 @@ class SeerActionModel(ActionModel):
         actions = [Action(f"S{i}{r}{j}", And(Atom(f"s{i}"), Atom(f"{r}{j}"))) 
                     for i in agents for j in agents for r in ROLES
                     if i != j]
-        equivs = {a: set((u.name, v.name) 
-                        for u in actions for v in actions
-                        if (u.name[1] != a and v.name[1] != a) or u == v)
-                    for a in agents}
-        ActionModel.__init__(self, actions, equivs)
-
-
-game_string = sys.argv[1]
-layout = "neato"
-if len(sys.argv) > 2:
-    layout = sys.argv[2]
-num_players = len(game_string)
-g = WerewolvesGame(game_string)
-print("Plotting initial model...")
-pos = g.plot_knowledge(layout)
-if game_string.count('w') == 2:
-    # If there are exactly two werewolves, apply the werewolf action model
-    action = WerewolfActionModel(num_players)
-    print("Plotting werewolf action model...")
-    action.plot(layout)
-    g.apply_action_model(action)
-    print("Plotting new model...")
-    g.plot_knowledge(layout, pos)
-if game_string.count('f') == 1 and game_string.count('w') in [1, 2]:
-    # If there is a familiar and one or two werewolves, apply a familiar action model
-    action = FamiliarActionModel(num_players, game_string.count('w'))
-    print("Plotting familiar action model...")
-    action.plot(layout)
-    g.apply_action_model(action)
-    print("Plotting new model...")
-    g.plot_knowledge(layout, pos)
-if game_string.count('m') == 2:
-    # If there are exactly two masons, apply the mason action model
-    action = MasonActionModel(num_players)
-    print("Plotting mason action model...")
-    action.plot(layout)
-    g.apply_action_model(action)
-    print("Plotting new model...")
-    g.plot_knowledge(layout, pos)
-if game_string.count('s') == 1:
-    # If there is a seer, apply the seer action model
-    action = SeerActionModel(num_players)
-    print("Plotting seer action model...")
-    action.plot(layout)
-    g.apply_action_model(action)
-    print("Plotting new model...")
-    g.plot_knowledge(layout)
\ No newline at end of file
+        equivs = {a: ActionModel.involvement_partition(actions, lambda name: name[1] == a) for a in agents}
+        ActionModel.__init__(self, actions, equivs, ("seer", num_players))
+
+
+class PipelineCache:
+    # On-disk, content-addressed cache of the models and plot layouts of each stage of a game. A stage is identified by
+    # a hash of everything it depends on: the code version, the roles and options, and the action models applied so
+    # far, so runs that share a prefix of stages reuse it. When the cache grows beyond max_bytes, the least recently
+    # used entries are evicted.
+    ENTRIES = (".kripke", ".layout")
+    TEMPORARY = ".tmp"
+
+    def __init__(self, directory, max_bytes=2 ** 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def version():
+        # Hash of the source of this script and of mlsolver, so that changing either invalidates the cache.
+        sources = [f for f in [globals().get('__file__')] if f is not None]
+        package = os.path.dirname(mlsolver.__file__)
+        sources += [os.path.join(package, f) for f in sorted(os.listdir(package)) if f.endswith(".py")]
+        digest = hashlib.sha256()
+        for source in sources:
+            with open(source, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def key(self, *parts):
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def path(self, key, suffix):
+        return os.path.join(self.directory, key + suffix)
+
+    def load_model(self, key):
+        # Another run may evict the entry at any time, which counts as a miss.
+        path = self.path(key, ".kripke")
+        try:
+            self.touch(path)
+            return KripkeStructure.load(path)
+        except FileNotFoundError:
+            return None
+
+    def save_model(self, key, kripke):
+        path = self.path(key, ".kripke")
+        self.write(path, lambda f: kripke.save(f))
+        # The model was saved to a temporary file first, but is stored in the entry from now on.
+        kripke.stored_path = path
+
+    def store_model(self, key, kripke):
+        # Stores the model in the entry for the key unless it's cached already, so that its file can be reused.
+        path = self.path(key, ".kripke")
+        try:
+            self.touch(path)
+            kripke.stored_path = path
+        except FileNotFoundError:
+            self.save_model(key, kripke)
+
+    def load_layout(self, key, layout):
+        path = self.path(key, "." + layout + ".layout")
+        try:
+            self.touch(path)
+            with open(path) as f:
+                return {name: tuple(xy) for (name, xy) in json.load(f)}
+        except FileNotFoundError:
+            return None
+
+    def save_layout(self, key, layout, pos):
+        def write(path):
+            with open(path, 'w') as f:
+                json.dump([(name, list(xy)) for (name, xy) in pos.items()], f)
+        self.write(self.path(key, "." + layout + ".layout"), write)
+
+    def touch(self, path):
+        # Modification times order the entries by last use.
+        os.utime(path)
+
+    def write(self, path, write):
+        # Write to a temporary file first, so that concurrent runs never read a partial entry. Temporary files have
+        # their own suffix, so that eviction leaves them alone.
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=PipelineCache.TEMPORARY)
+        os.close(handle)
+        try:
+            write(temporary)
+            os.replace(temporary, path)
+        except BaseException:
+            try:
+                os.remove(temporary)
+            except FileNotFoundError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        # Only finished entries are evicted. Other runs may evict or touch the same entries concurrently, so entries
+        # that are gone by the time they are looked at are skipped.
+        entries = []
+        for f in os.listdir(self.directory):
+            if f.endswith(PipelineCache.ENTRIES):
+                try:
+                    stat = os.stat(os.path.join(self.directory, f))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, f)))
+        entries.sort()
+        total = sum(size for (_, size, _) in entries)
+        for (_, size, entry) in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(entry)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def night_action_models(game_string):
+    # The action models of the night phase for the given roles, in the order they are applied, with the role acting.
+    num_players = len(game_string)
+    night = []
+    if game_string.count('w') == 2:
+        # If there are exactly two werewolves, apply the werewolf action model
+        night.append(("werewolf", WerewolfActionModel(num_players)))
+    if game_string.count('f') == 1 and game_string.count('w') in [1, 2]:
+        # If there is a familiar and one or two werewolves, apply a familiar action model
+        night.append(("familiar", FamiliarActionModel(num_players, game_string.count('w'))))
+    if game_string.count('m') == 2:
+        # If there are exactly two masons, apply the mason action model
+        night.append(("mason", MasonActionModel(num_players)))
+    if game_string.count('s') == 1:
+        # If there is a seer, apply the seer action model
+        night.append(("seer", SeerActionModel(num_players)))
+    return night
+
+def show_model(g, layout, pos=None):
+    # Symbolic models are too large to plot, so only their size is shown.
+    if g.symbolic:
+        print(f"{g.kripke.count()} worlds")
+        return pos
+    return g.plot_knowledge(layout, pos)
+
+def show_action_model(g, action, layout):
+    if not g.symbolic:
+        action.plot(layout)
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a not in ["--contract", "--symbolic", "--compose", "--cache", "--parallel"]]
+    game_string = args[0]
+    layout = "neato"
+    if len(args) > 1:
+        layout = args[1]
+    num_players = len(game_string)
+    cache = None
+    if "--cache" in sys.argv:
+        cache = PipelineCache(os.path.join(os.path.expanduser("~"), ".cache", "onuw"))
+    elif "--parallel" in sys.argv:
+        print("Warning: --parallel without --cache saves every model to a temporary file first, which is slower than "
+              "evaluating it serially", file=sys.stderr)
+    g = WerewolvesGame(game_string, contract="--contract" in sys.argv, symbolic="--symbolic" in sys.argv, cache=cache,
+                       parallel="--parallel" in sys.argv)
+    print("Plotting initial model...")
+    pos = show_model(g, layout)
+    night = night_action_models(game_string)
+    if "--compose" in sys.argv:
+        # Apply the whole night in one product update, without building the intermediate models
+        action = ActionModel.compose([action for (_, action) in night], g.kripke)
+        print("Applying composed night action model...")
+        g.apply_action_model(action)
+        print("Plotting new model...")
+        show_model(g, layout)
+    else:
+        for (role, action) in night:
+            print(f"Plotting {role} action model...")
+            show_action_model(g, action, layout)
+            g.apply_action_model(action)
+            print("Plotting new model...")
+            # The seer model has too many worlds to reuse the initial positions
+            show_model(g, layout, None if role == "seer" else pos)